@@ -4,15 +4,21 @@ Endpoints for document management.
 """
 import os
 import uuid
+import hashlib
 from datetime import datetime
 from pathlib import Path
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 
 from app.models.document import DocumentModel
-from app.services.document_processor import process_and_index_document, delete_document_from_index
+from app.services.document_processor import purge_document
+from app.services.ingestion_queue import enqueue
 from app.core.usage_middleware import check_usage_limits
 from app.core.security import get_current_admin
+from app.services.cache import invalidate_tenant_cache
+from app.services.tenant_profile import invalidate_tenant_profile, resolve_tenant_tier
+from app.services.metering import record_usage
 from fastapi import Depends
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -21,12 +27,39 @@ router = APIRouter(prefix="/admin", tags=["Admin"])
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Uploads are copied to disk in blocks of this size (bounded memory per upload)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
 
 class UploadResponse(BaseModel):
     doc_id: str
     filename: str
     status: str
     message: str
+    duplicate: bool = False  # True when an identical file was already uploaded
+
+
+async def save_upload(file: UploadFile, file_path: Path) -> tuple:
+    """Copy an upload to disk block by block. Returns (size in bytes, SHA-256 hex)."""
+    digest = hashlib.sha256()
+    file_size = 0
+    with open(file_path, "wb") as f:
+        while block := await file.read(UPLOAD_CHUNK_BYTES):
+            digest.update(block)
+            file_size += len(block)
+            f.write(block)
+    return file_size, digest.hexdigest()
+
+
+def duplicate_response(existing: dict, filename: str) -> dict:
+    print(f"♻️ DUPLICATE UPLOAD: '{filename}' is identical to '{existing['filename']}' ({existing['_id']})")
+    return {
+        "doc_id": existing["_id"],
+        "filename": existing["filename"],
+        "status": existing["status"],
+        "message": f"Identical to '{existing['filename']}', already uploaded",
+        "duplicate": True
+    }
 
 
 @router.post("/documents/upload", response_model=UploadResponse)
@@ -37,17 +70,18 @@ async def upload_document(
     current_admin: dict = Depends(get_current_admin)
 ):
     """
-    Upload and process a document.
+    Upload a document and queue it for ingestion.
+    
+    Returns right away with status "pending"; poll
+    GET /admin/documents/{doc_id}/status for progress. A file identical to
+    one the company already uploaded is not processed again: the existing
+    document is returned with duplicate=true.
     
-    Supported formats: .md, .txt
+    Supported formats: .md, .txt, .pdf
     """
     # Extract Company ID securely from token
     company_id = current_admin["company_id"]
     
-    # Check document upload limit
-    if company_id:
-        await check_usage_limits(request, company_id, action="document")
-
     # Validate file type
     if not file.filename.lower().endswith(('.md', '.txt', '.pdf')):
         raise HTTPException(
@@ -62,69 +96,180 @@ async def upload_document(
     file_path = UPLOAD_DIR / f"{doc_id}_{file.filename}"
     
     try:
-        # Write uploaded file to disk
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Get company tier to determine dimensions
-        from app.db.mongodb import db
-        from app.models.subscription import get_tier_dimensions
+        # Stream the upload to disk, hashing and measuring it on the way
+        file_size, content_hash = await save_upload(file, file_path)
+    except Exception as e:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+    # Whole-file dedupe: the company already has these exact bytes (under any name)
+    existing = await DocumentModel.find_by_content_hash(company_id, content_hash)
+    if existing:
+        file_path.unlink(missing_ok=True)
+        return duplicate_response(existing, file.filename)
+
+    # Check document upload limit (duplicates above don't take a new slot)
+    if company_id:
+        try:
+            await check_usage_limits(request, company_id, action="document")
+        except HTTPException:
+            file_path.unlink(missing_ok=True)
+            raise
+
+    try:
+        # Get company tier to determine dimensions (starter if unknown)
+        tier = await resolve_tenant_tier(company_id)
+        dimensions = tier.dimensions
+        print(f"🏢 Company '{company_id}' tier: {tier.tier} → using {dimensions}-dim embeddings ({tier.index_name})")
         
-        company = None
-        dimensions = 384  # Default to starter
+        # Create document record (the ingestion job reads it back)
+        try:
+            await DocumentModel.create(
+                doc_id=doc_id,
+                filename=file.filename,
+                doc_type=doc_type,
+                company_id=company_id, # Save namespace
+                dimensions=dimensions,   # Track dimensions
+                file_size=file_size,     # Track size
+                file_path=str(file_path),
+                content_hash=content_hash
+            )
+        except DuplicateKeyError:
+            # A concurrent upload of the same bytes was recorded first
+            file_path.unlink(missing_ok=True)
+            existing = await DocumentModel.find_by_content_hash(company_id, content_hash)
+            if existing is None:
+                raise HTTPException(status_code=409, detail="An identical upload is in progress; try again")
+            return duplicate_response(existing, file.filename)
         
+        # Count the document now so concurrent uploads respect the tier limit;
+        # the ingestion job gives the slot back if processing fails (write-behind)
         if company_id:
-            company = await db.admins.find_one({"company_id": company_id.lower()})
-            if company:
-                tier = company.get("subscription_tier", "starter")
-                dimensions = get_tier_dimensions(tier)
-                print(f"🏢 Company '{company_id}' tier: {tier} → using {dimensions}-dim embeddings")
+            record_usage(company_id, "documents_count")
         
-        # Create document record
-        await DocumentModel.create(
-            doc_id=doc_id,
-            filename=file.filename,
-            doc_type=doc_type,
-            company_id=company_id, # Save namespace
-            dimensions=dimensions,   # Track dimensions
-            file_size=len(content)   # Track size
-        )
-        
-        # Process and index with tier-specific dimensions
-        result = await process_and_index_document(
-            file_path=str(file_path),
-            doc_id=doc_id,
-            doc_type=doc_type,
-            filename=file.filename,
-            company_id=company_id, # Pass namespace
-            dimensions=dimensions    # Pass tier-specific dimensions
-        )
-        
-        # Update document status
-        await DocumentModel.update_status(
-            doc_id=doc_id,
-            status=result["status"],
-            chunk_count=result["chunk_count"],
-            pinecone_ids=result["pinecone_ids"]
-        )
-        
-        # Increment document count for the company
-        if company_id:
-            from app.models.admin_helpers import AdminSubscriptionHelpers
-            await AdminSubscriptionHelpers.increment_document_count(company_id)
+        # Parse, embed and index in the background
+        enqueue(doc_id, company_id)
         
         return {
             "doc_id": doc_id,
             "filename": file.filename,
-            "status": "indexed",
-            "message": f"Successfully indexed {result['chunk_count']} chunks"
+            "status": "pending",
+            "message": "Document queued for processing"
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         # Update status to failed
-        await DocumentModel.update_status(doc_id=doc_id, status="failed")
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+        await DocumentModel.update_status(doc_id=doc_id, status="failed", error=str(e))
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+
+@router.put("/documents/{doc_id}", response_model=UploadResponse)
+async def replace_document(
+    doc_id: str,
+    request: Request,
+    file: UploadFile = File(...),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """
+    Replace an indexed document with a new version of the file.
+    
+    The document keeps its ID, name and type. Re-indexing is incremental:
+    only chunks whose content changed are embedded and upserted, and chunks
+    that disappeared are deleted. The previous version keeps serving
+    answers until the new one is indexed.
+    """
+    company_id = current_admin["company_id"]
+
+    doc = await DocumentModel.get_by_id(doc_id, company_id=company_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.get("status") != "indexed":
+        raise HTTPException(status_code=409, detail=f"Document is {doc.get('status')}; only indexed documents can be replaced")
+
+    # The parser is chosen by the document's original name
+    if Path(file.filename).suffix.lower() != Path(doc["filename"]).suffix.lower():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Replacement must be a {Path(doc['filename']).suffix} file"
+        )
+
+    file_path = UPLOAD_DIR / f"{doc_id}_{uuid.uuid4().hex[:8]}_{doc['filename']}"
+    try:
+        file_size, content_hash = await save_upload(file, file_path)
+    except Exception as e:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+    if content_hash == doc.get("content_hash"):
+        # Same bytes as the current version: nothing to re-index
+        file_path.unlink(missing_ok=True)
+        return {
+            "doc_id": doc_id,
+            "filename": doc["filename"],
+            "status": "indexed",
+            "message": "File is identical to the current version",
+            "duplicate": True
+        }
+
+    try:
+        previous = await DocumentModel.start_revision(
+            doc_id,
+            company_id,
+            file_path=str(file_path),
+            file_size=file_size,
+            content_hash=content_hash,
+            previous_content_hash=doc.get("content_hash"),
+            previous_file_path=doc.get("file_path")
+        )
+    except DuplicateKeyError:
+        file_path.unlink(missing_ok=True)
+        existing = await DocumentModel.find_by_content_hash(company_id, content_hash)
+        name = existing["filename"] if existing else "another document"
+        raise HTTPException(status_code=409, detail=f"File is identical to '{name}', already uploaded")
+    except Exception as e:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+    if previous is None:
+        # Another replace (or a delete) got there first
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=409, detail="Document changed while uploading; try again")
+
+    enqueue(doc_id, company_id)
+
+    return {
+        "doc_id": doc_id,
+        "filename": doc["filename"],
+        "status": "pending",
+        "message": "New version queued for re-indexing"
+    }
+
+
+@router.get("/documents/{doc_id}/status")
+async def get_document_status(
+    doc_id: str,
+    request: Request,
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Ingestion status and progress of an uploaded document."""
+    company_id = current_admin["company_id"]
+
+    doc = await DocumentModel.get_by_id(doc_id, company_id=company_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return {
+        "doc_id": doc_id,
+        "filename": doc.get("filename"),
+        "status": doc.get("status"),
+        "chunk_count": doc.get("chunk_count", 0),
+        "progress": doc.get("progress"),
+        "error": doc.get("error"),
+        "updated_at": doc.get("updated_at")
+    }
 
 
 @router.get("/documents")
@@ -159,19 +304,24 @@ async def delete_document(
         # If not found with company_id, it's either non-existent or belongs to another tenant
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete from Pinecone
-    if doc.get("pinecone_ids"):
-        try:
-            await delete_document_from_index(
-                doc["pinecone_ids"], 
-                company_id=company_id,
-                dimensions=doc.get("dimensions", 384)
-            )
-        except Exception as e:
-            print(f"⚠️ Pinecone delete failed: {e}")
-            # Continue to delete from DB even if Pinecone fails
+    # Delete vectors and chunks (Keyword Search). Chunks are found by
+    # (company_id, doc_id): failed uploads and interrupted runs leave
+    # chunks that are not listed in pinecone_ids
+    try:
+        # Vectors live in the index of the tier at upload time; legacy
+        # records without it fall back to the company's current tier
+        dimensions = doc.get("dimensions") or (await resolve_tenant_tier(company_id)).dimensions
+        await purge_document(
+            doc_id,
+            company_id=company_id,
+            dimensions=dimensions,
+            vector_ids=doc.get("pinecone_ids")
+        )
+    except Exception as e:
+        print(f"⚠️ Chunk delete failed: {e}")
+        # Continue to delete from DB even if Pinecone fails
             
-    # Delete from Internal Documents (Keyword Search)
+    # Delete legacy Internal Documents
     from app.db.mongodb import db
     # Ensure deletion is scoped, though doc_id is unique
     await db.internal_documents.delete_many({"doc_id": doc_id, "company_id": company_id})
@@ -187,10 +337,13 @@ async def delete_document(
     # Delete from MongoDB (scoped)
     await DocumentModel.delete(doc_id, company_id=company_id)
     
-    # Decrement document count for the company
-    if company_id:
-        from app.models.admin_helpers import AdminSubscriptionHelpers
-        await AdminSubscriptionHelpers.increment_document_count(company_id, -1)
+    # Decrement document count for the company (write-behind);
+    # failed uploads already gave their slot back
+    if company_id and doc.get("status") != "failed":
+        record_usage(company_id, "documents_count", -1)
+    
+    # Corpus changed: cached answers for this tenant may be stale
+    invalidate_tenant_cache(company_id)
     
     return {"message": f"Document {doc['filename']} deleted successfully"}
 
@@ -225,6 +378,7 @@ async def update_my_subscription(
         {"company_id": company_id},
         {"$set": {"subscription_tier": payload.tier_id}}
     )
+    invalidate_tenant_profile(company_id)
     
     if result.modified_count == 0:
         # Check if it was already that tier
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from app.db.mongodb import db
-from app.db.pinecone_client import get_index
+from app.services.vector_store import get_vector_store
+from app.services.keyword_retriever import drop_tenant_index
 
 from app.core.security import verify_super_admin_token
+from app.services.tenant_profile import invalidate_tenant_profile, resolve_tenant_tier
 
 router = APIRouter(prefix="/super", tags=["Super Admin"])
 
@@ -40,23 +42,30 @@ async def delete_company(company_id: str):
     
     company_id = company_id.lower()
     
+    # Indexes holding this tenant's vectors: its current tier's, plus any
+    # earlier tier a document was uploaded under (read before the records go)
+    dimensions = {(await resolve_tenant_tier(company_id)).dimensions}
+    dimensions.update(d for d in await db.documents.distinct("dimensions", {"company_id": company_id}) if d)
+    
     # 1. Delete Admin Account
     res_admin = await db.admins.delete_one({"company_id": company_id})
+    invalidate_tenant_profile(company_id)
     
     # 2. Delete Employee Accounts
     res_users = await db.users.delete_many({"company_id": company_id})
     
-    # 3. Delete Documents & Metadata
+    # 3. Delete Documents & Metadata (and their chunks / keyword index)
     res_docs = await db.documents.delete_many({"company_id": company_id})
+    await db.chunks.delete_many({"company_id": company_id})
+    drop_tenant_index(company_id)
     
     # 4. Delete Conversations
     res_convs = await db.conversations.delete_many({"company_id": company_id})
     
     # 5. Delete Pinecone Vectors (Namespace)
     try:
-        index = get_index()
-        # Pinecone delete_all(namespace=...)
-        index.delete(delete_all=True, namespace=company_id)
+        for dim in sorted(dimensions):
+            get_vector_store(dim).delete_namespace(company_id)
         pinecone_status = "Deleted Namespace"
     except Exception as e:
         pinecone_status = f"Pinecone Error: {str(e)}"
@@ -101,6 +110,7 @@ async def update_company_tier(company_id: str, payload: UpdateTierRequest):
     
     try:
         await AdminSubscriptionHelpers.update_subscription_tier(company_id, payload.new_tier)
+        invalidate_tenant_profile(company_id)
         tier_info = get_tier_features(payload.new_tier)
         
         return {
@@ -127,6 +137,7 @@ async def update_company_status(company_id: str, payload: UpdateStatusRequest):
     
     try:
         await AdminSubscriptionHelpers.update_subscription_status(company_id, payload.status)
+        invalidate_tenant_profile(company_id)
         return {
             "message": f"Status updated to {payload.status}",
             "company_id": company_id,
@@ -6,6 +6,7 @@ import secrets
 from passlib.context import CryptContext
 
 from app.core.security import get_current_admin
+from app.services.tenant_profile import invalidate_tenant_profile
 
 router = APIRouter(prefix="/api-keys", tags=["API Keys"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -43,6 +44,7 @@ async def generate_api_key(
     }
     
     await AdminModel.add_api_key(company_id, key_data)
+    invalidate_tenant_profile(company_id)
     
     return {
         "status": "success",
@@ -82,4 +84,5 @@ async def revoke_api_key(
     """Revoke an API key."""
     company_id = current_admin["company_id"]
     await AdminModel.revoke_api_key(company_id, key_id)
+    invalidate_tenant_profile(company_id)
     return {"status": "success", "message": "Key revoked"}
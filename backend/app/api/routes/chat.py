@@ -1,9 +1,13 @@
+import json
+
 from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.core.rate_limit import limiter
-from app.core.usage_middleware import check_usage_limits
-from app.services.chat_orchestrator import process_chat
+from app.core.usage_middleware import reserve_query_quota
+from app.services.metering import release_query
+from app.services.chat_orchestrator import process_chat, stream_chat
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
@@ -19,11 +23,13 @@ class ChatRequest(BaseModel):
 
 
 # ============================
-# Chat Endpoint
+# Authentication
 # ============================
-@router.post("")  # ✅ NO trailing slash
-@limiter.limit("5/minute")
-async def chat(request: Request, payload: ChatRequest):
+async def authenticate_chat_request(request: Request, payload: ChatRequest) -> tuple[str, str]:
+    """
+    Resolve (company_id, user_id) for a chat request and enforce authentication.
+    Shared by the JSON and streaming chat endpoints.
+    """
     # Extract Company ID from headers
     company_id = request.headers.get("X-Company-ID", None)
     
@@ -66,8 +72,8 @@ async def chat(request: Request, payload: ChatRequest):
                 token = auth_header.split(" ")[1]
                 import jwt
                 from app.core.config import SECRET_KEY
-                payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-                company_id = payload.get("company_id")
+                token_payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+                company_id = token_payload.get("company_id")
                 is_authenticated = True
                 print(f"🔑 JWT Verified for Chat: {company_id}")
         except Exception as e:
@@ -85,14 +91,77 @@ async def chat(request: Request, payload: ChatRequest):
 
     # =========================================================================
 
-    # Check usage limits if company_id is provided
+    # Check usage limits and consume one query in a single round-trip
     if company_id:
-        await check_usage_limits(request, company_id, action="query")
+        await reserve_query_quota(request, company_id)
 
-    response = await process_chat(
-        user_id=final_user_id,
-        conversation_id=payload.conversation_id,
-        question=payload.question,
-        company_id=company_id  # Pass to orchestrator
-    )
+    return company_id, final_user_id
+
+
+# ============================
+# Chat Endpoint
+# ============================
+@router.post("")  # ✅ NO trailing slash
+@limiter.limit("5/minute")
+async def chat(request: Request, payload: ChatRequest):
+    company_id, final_user_id = await authenticate_chat_request(request, payload)
+
+    try:
+        response = await process_chat(
+            user_id=final_user_id,
+            conversation_id=payload.conversation_id,
+            question=payload.question,
+            company_id=company_id  # Pass to orchestrator
+        )
+    except Exception:
+        # Failed before an answer was produced: refund the reserved query
+        await release_query(company_id)
+        raise
     return response
+
+
+# ============================
+# Streaming Chat Endpoint (SSE)
+# ============================
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/stream")
+@limiter.limit("5/minute")
+async def chat_stream(request: Request, payload: ChatRequest):
+    """
+    Server-Sent Events variant of POST /chat.
+
+    Emits `meta` (sources, confidence) as soon as retrieval finishes, then one
+    `token` event per answer delta from Gemini, then `done` with the final
+    response (same shape as POST /chat).
+    """
+    company_id, final_user_id = await authenticate_chat_request(request, payload)
+
+    async def event_stream():
+        answered = False
+        try:
+            async for event, data in stream_chat(
+                user_id=final_user_id,
+                conversation_id=payload.conversation_id,
+                question=payload.question,
+                company_id=company_id
+            ):
+                answered = answered or event == "token"
+                yield format_sse(event, data)
+        except Exception as e:
+            print(f"❌ Chat stream failed: {e}")
+            if not answered:
+                # Failed before generation: refund the reserved query
+                await release_query(company_id)
+            yield format_sse("error", {"detail": "I'm temporarily unable to access internal knowledge."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens flush immediately
+        }
+    )
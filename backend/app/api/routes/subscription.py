@@ -9,6 +9,7 @@ from typing import List, Dict, Any
 
 from app.models.subscription import get_all_tiers, get_tier_features
 from app.models.admin_helpers import AdminSubscriptionHelpers
+from app.services.tenant_profile import invalidate_tenant_profile
 
 router = APIRouter(prefix="/subscription", tags=["Subscription"])
 
@@ -50,6 +51,7 @@ async def update_company_tier(payload: UpdateTierRequest):
             payload.company_id, 
             payload.new_tier
         )
+        invalidate_tenant_profile(payload.company_id)
         return {
             "message": f"Subscription updated to {payload.new_tier}",
             "company_id": payload.company_id,
@@ -70,6 +72,7 @@ async def suspend_company(payload: SuspendCompanyRequest):
         payload.company_id,
         "suspended"
     )
+    invalidate_tenant_profile(payload.company_id)
     return {
         "message": "Company suspended",
         "company_id": payload.company_id
@@ -83,6 +86,7 @@ async def activate_company(payload: SuspendCompanyRequest):
         payload.company_id,
         "active"
     )
+    invalidate_tenant_profile(payload.company_id)
     return {
         "message": "Company activated",
         "company_id": payload.company_id
@@ -7,3 +7,32 @@ router = APIRouter(prefix="/system", tags=["System"])
 async def get_system_info():
     doc = await db.system_info.find_one({"_id": "corpwise"}, {"_id": 0})
     return doc
+
+
+@router.get("/metrics")
+async def get_system_metrics():
+    """In-process performance counters for this worker (batching queues, caches)."""
+    from app.services.cross_encoder_reranker import ce_batcher
+    from app.services.embeddings import batching_metrics, cache_metrics
+    from app.services.cache import semantic_cache_metrics
+    from app.services.chat_orchestrator import chat_flight
+    from app.services.tenant_profile import tenant_profile_metrics
+    from app.services.metering import metering_metrics
+    from app.services.keyword_retriever import bm25_metrics
+    from app.services.ingestion_queue import ingestion_metrics
+    from app.services.pdf_extractor import pdf_metrics
+    from app.services.upsert_pipeline import upsert_metrics
+
+    return {
+        "cross_encoder": ce_batcher.metrics(),
+        "embeddings": batching_metrics(),
+        "embedding_cache": cache_metrics(),
+        "response_cache": semantic_cache_metrics(),
+        "single_flight": chat_flight.metrics(),
+        "tenant_profiles": tenant_profile_metrics(),
+        "usage_metering": metering_metrics(),
+        "keyword_index": bm25_metrics(),
+        "ingestion": ingestion_metrics(),
+        "pdf_extraction": pdf_metrics(),
+        "vector_upserts": upsert_metrics()
+    }
@@ -4,6 +4,7 @@ from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, SUPER_USER_KEY
 from app.models.admin import AdminModel
+from app.services.tenant_profile import get_tenant_profile
 from passlib.context import CryptContext
 from app.db.mongodb import db
 
@@ -48,23 +49,32 @@ async def verify_api_key(api_key: str, company_id: str) -> dict | None:
     Verify an API key for a specific company.
     Returns the key entry (dict) if valid, None otherwise.
     Also updates the 'last_used' timestamp of the key.
+
+    The key hash is matched against the cached tenant profile, but the key
+    must still exist in Mongo: a key revoked on another worker stops
+    working immediately, not when that worker's cache expires.
     """
     if not api_key or not company_id:
         return None
 
     # Get admin/company
-    admin = await AdminModel.get_by_company(company_id)
-    if not admin:
+    admin = await get_tenant_profile(company_id)
+    key_entry = _match_api_key(api_key, admin.get("api_keys", []) if admin else [])
+    if key_entry is None:
+        # Keys created on another worker may not be in the cached profile yet
+        key_entry = _match_api_key(api_key, await AdminModel.get_api_keys(company_id))
+        if key_entry is None:
+            return None
+
+    # Uncached revocation check: the last_used update only matches a key that still exists
+    if not await AdminModel.update_api_key_usage(company_id, key_entry["key_id"]):
         return None
+    return key_entry
 
-    api_keys = admin.get("api_keys", [])
-    
+
+def _match_api_key(api_key: str, api_keys: list) -> dict | None:
     for key_entry in api_keys:
         # Check if key matches specific entry
         if pwd_context.verify(api_key, key_entry["key_hash"]):
-            # Key is valid!
-            # Update last_used timestamp async (fire and forget pattern ideally, but await here is fine)
-            await AdminModel.update_api_key_usage(company_id, key_entry["key_id"])
             return key_entry
-
     return None
@@ -6,8 +6,9 @@ before processing requests.
 """
 
 from fastapi import Request, HTTPException
-from app.db.mongodb import db
 from app.models.subscription import get_tier_features
+from app.services.tenant_profile import get_tenant_profile
+from app.services.metering import pending_usage, reserve_query
 
 
 async def check_usage_limits(request: Request, company_id: str, action: str):
@@ -22,8 +23,8 @@ async def check_usage_limits(request: Request, company_id: str, action: str):
     Raises:
         HTTPException: 404 if company not found, 429 if limit exceeded
     """
-    # Fetch company from database
-    company = await db.admins.find_one({"company_id": company_id.lower()})
+    # Fetch company (short-TTL cache shared with auth and tier lookups)
+    company = await get_tenant_profile(company_id)
     
     if not company:
         raise HTTPException(
@@ -45,6 +46,7 @@ async def check_usage_limits(request: Request, company_id: str, action: str):
     
     if action == "query":
         max_queries = tier_features["max_queries_per_month"]
+        # Queries are counted synchronously by reserve_query: nothing is pending
         current_queries = usage.get("queries_this_month", 0)
         
         # -1 means unlimited
@@ -58,7 +60,8 @@ async def check_usage_limits(request: Request, company_id: str, action: str):
     
     elif action == "document":
         max_docs = tier_features["max_documents"]
-        current_docs = usage.get("documents_count", 0)
+        # Persisted total plus uploads/deletes not yet flushed by the metering task
+        current_docs = usage.get("documents_count", 0) + pending_usage(company_id, "documents_count")
         
         # -1 means unlimited
         if max_docs != -1 and current_docs >= max_docs:
@@ -71,3 +74,27 @@ async def check_usage_limits(request: Request, company_id: str, action: str):
     
     else:
         raise ValueError(f"Invalid action: {action}. Must be 'query' or 'document'")
+
+
+async def reserve_query_quota(request: Request, company_id: str):
+    """
+    Atomically check the query limit and consume one query for this request.
+
+    One conditional update replaces the read in `check_usage_limits` plus the
+    later increment, so a burst of concurrent requests cannot overshoot the
+    monthly limit. Release with `release_query` if the request fails before
+    generation.
+
+    Raises:
+        HTTPException: 404 if company not found, 403 if inactive, 429 if limit exceeded
+    """
+    if await reserve_query(company_id):
+        print(f"📊 USAGE: Reserved 1 query for {company_id}")
+        return
+
+    # Nothing was consumed; work out why for the error response
+    await check_usage_limits(request, company_id, action="query")
+    raise HTTPException(
+        status_code=429,
+        detail="Monthly query limit reached. Please upgrade your plan or wait for next billing cycle."
+    )
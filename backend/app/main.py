@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,12 @@ from app.api.routes.subscription import router as subscription_router  # NEW
 
 from app.core.rate_limit import limiter
 from app.db.mongodb import db
+from app.services.llm.gemini_client import close_gemini_client
+from app.services.cache import run_hit_count_flusher
+from app.services.metering import run_usage_flusher
+from app.services.ingestion_queue import run_ingestion_workers
+from app.services.pdf_extractor import shutdown_pdf_pool
+from app.services.vector_store import VECTOR_STORE_BACKEND, run_vector_compactor
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,8 +35,20 @@ logging.basicConfig(
 async def lifespan(app: FastAPI):
     collections = await db.list_collection_names()
     logger.info("MongoDB connected. Collections: %s", collections)
+    background_tasks = [
+        asyncio.create_task(run_hit_count_flusher()),
+        asyncio.create_task(run_usage_flusher()),
+        asyncio.create_task(run_ingestion_workers()),
+    ]
+    if VECTOR_STORE_BACKEND == "local":
+        background_tasks.append(asyncio.create_task(run_vector_compactor()))
     yield
     logger.info("CORPWISE shutting down")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    shutdown_pdf_pool()
+    await close_gemini_client()
 
 # =====================================================
 # FastAPI App (CREATE FIRST)
@@ -128,8 +128,11 @@ class AdminModel:
 
     @staticmethod
     async def update_api_key_usage(company_id, key_id):
-        """Update the last_used timestamp for a specific API key."""
-        await db.admins.update_one(
+        """
+        Update the last_used timestamp for a specific API key.
+        Returns False if the key no longer exists (revoked or company deleted).
+        """
+        result = await db.admins.update_one(
             {
                 "company_id": company_id.lower(),
                 "api_keys.key_id": key_id
@@ -138,3 +141,4 @@ class AdminModel:
                 "$set": {"api_keys.$.last_used": datetime.utcnow()}
             }
         )
+        return result.matched_count > 0
@@ -90,8 +90,6 @@ class AdminSubscriptionHelpers:
         
         Returns True if company was deleted, False if not found.
         """
-        from app.db.pinecone_client import get_index
-        
         company_id_lower = company_id.lower()
         
         # 1. Delete company record from MongoDB
@@ -104,17 +102,18 @@ class AdminSubscriptionHelpers:
         await db.documents.delete_many({"company_id": company_id_lower})
 
         # 3. Delete all chunks associated with this company
+        from app.services.keyword_retriever import drop_tenant_index
         await db.chunks.delete_many({"company_id": company_id_lower})
+        drop_tenant_index(company_id_lower)
         
         # 4. Delete Pinecone namespace (all vectors for this company) from ALL indexes
-        from app.db.pinecone_client import get_index, INDEX_NAMES
+        from app.db.pinecone_client import INDEX_NAMES
+        from app.services.vector_store import get_vector_store
         
         for dim in INDEX_NAMES.keys():
             try:
-                index = get_index(dim)
-                # Check if we can/should delete. 
-                # Ideally we check stats first, but delete_all=True on a namespace is usually safe/idempotent
-                index.delete(delete_all=True, namespace=company_id_lower)
+                # Deleting a whole namespace is idempotent, so no need to check stats first
+                get_vector_store(dim).delete_namespace(company_id_lower)
                 print(f"🗑️ DELETED: Pinecone namespace '{company_id_lower}' wiped from {dim}-dim index")
             except Exception as e:
                 print(f"⚠️ WARNING: Failed to delete Pinecone namespace '{company_id_lower}' from {dim}-dim index: {e}")
@@ -4,8 +4,14 @@ MongoDB schema for tracking uploaded documents.
 """
 from datetime import datetime
 from typing import List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app.db.mongodb import db
 
+# Statuses of a document that counts for whole-file dedupe; a company has at most
+# one live document per content_hash (unique partial index, see scripts/init_db.py)
+LIVE_STATUSES = ["pending", "processing", "indexed"]
+
 
 class DocumentModel:
     """Handles document metadata in MongoDB."""
@@ -20,9 +26,11 @@ class DocumentModel:
         uploaded_by: str = "system",
         company_id: Optional[str] = None,
         dimensions: int = 0,
-        file_size: int = 0
+        file_size: int = 0,
+        file_path: Optional[str] = None,
+        content_hash: Optional[str] = None
     ):
-        """Create a new document record."""
+        """Create a new document record (status "pending" until ingestion finishes)."""
         document = {
             "_id": doc_id,
             "filename": filename,
@@ -31,6 +39,8 @@ class DocumentModel:
             "company_id": company_id,
             "dimensions": dimensions,
             "file_size": file_size,
+            "file_path": file_path,  # Where the ingestion job reads the upload from
+            "content_hash": content_hash,  # SHA-256 of the uploaded bytes
             "uploaded_at": datetime.utcnow(),
             "status": "pending",
             "chunk_count": 0,
@@ -44,23 +54,138 @@ class DocumentModel:
     async def update_status(
         doc_id: str,
         status: str,
-        chunk_count: int = 0,
-        pinecone_ids: List[str] = None
+        chunk_count: Optional[int] = None,
+        pinecone_ids: List[str] = None,
+        progress: Optional[dict] = None,
+        error: Optional[str] = None
     ):
-        """Update document processing status."""
+        """Update document processing status (and ingestion progress); omitted fields are left as they are."""
         update_data = {
             "status": status,
-            "chunk_count": chunk_count
+            "updated_at": datetime.utcnow()  # Doubles as the ingestion job heartbeat
         }
         
+        if chunk_count is not None:
+            update_data["chunk_count"] = chunk_count
         if pinecone_ids:
            update_data["pinecone_ids"] = pinecone_ids
+        if progress is not None:
+            update_data["progress"] = progress
+        if error is not None:
+            update_data["error"] = error
         
         await DocumentModel.collection.update_one(
             {"_id": doc_id},
             {"$set": update_data}
         )
     
+    @staticmethod
+    async def claim(doc_id: str, stale_before: datetime):
+        """
+        Atomically take a pending (or abandoned in-progress) document for
+        ingestion. Returns the document, or None if another worker has it.
+        """
+        return await DocumentModel.collection.find_one_and_update(
+            {
+                "_id": doc_id,
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "processing", "updated_at": {"$lt": stale_before}}
+                ]
+            },
+            {"$set": {"status": "processing", "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    @staticmethod
+    async def heartbeat(doc_id: str):
+        """Mark an ingestion job as alive so it is not considered stale and re-claimed."""
+        await DocumentModel.collection.update_one(
+            {"_id": doc_id, "status": "processing"},
+            {"$set": {"updated_at": datetime.utcnow()}}
+        )
+    
+    @staticmethod
+    async def start_revision(
+        doc_id: str,
+        company_id: Optional[str],
+        file_path: str,
+        file_size: int,
+        content_hash: str,
+        previous_content_hash: Optional[str] = None,
+        previous_file_path: Optional[str] = None
+    ):
+        """
+        Point an indexed document at a replacement file and mark it pending
+        for re-indexing. Returns the document as it was before, or None if
+        it is missing or not currently indexed.
+        """
+        query = {"_id": doc_id, "status": "indexed"}
+        if company_id:
+            query["company_id"] = company_id
+
+        return await DocumentModel.collection.find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": "pending",
+                    "file_path": file_path,
+                    "file_size": file_size,
+                    "content_hash": content_hash,
+                    "previous_content_hash": previous_content_hash,  # Restored if the revision fails
+                    "previous_file_path": previous_file_path,        # Kept until the revision is indexed
+                    "progress": None,
+                    "error": None,
+                    "replaced_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow()
+                },
+                "$inc": {"revision": 1}
+            }
+        )
+    
+    @staticmethod
+    async def restore_previous_revision(doc_id: str, content_hash: Optional[str], file_path: Optional[str],
+                                        chunk_count: int, error: str):
+        """A replacement failed to index: mark the previous version (still indexed) current again."""
+        restored = {
+            "status": "indexed",
+            "content_hash": content_hash,
+            "file_path": file_path,
+            "previous_file_path": None,
+            "chunk_count": chunk_count,
+            "progress": {"stage": "failed"},
+            "error": error,
+            "updated_at": datetime.utcnow()
+        }
+        try:
+            await DocumentModel.collection.update_one({"_id": doc_id}, {"$set": restored})
+        except DuplicateKeyError:
+            # The previous bytes were uploaded again as another document meanwhile;
+            # that one owns the hash now
+            restored["content_hash"] = None
+            await DocumentModel.collection.update_one({"_id": doc_id}, {"$set": restored})
+    
+    @staticmethod
+    async def find_by_content_hash(company_id: Optional[str], content_hash: str):
+        """A live (indexed or queued) document of the company with exactly this file content."""
+        return await DocumentModel.collection.find_one({
+            "company_id": company_id,
+            "content_hash": content_hash,
+            "status": {"$in": LIVE_STATUSES}
+        })
+    
+    @staticmethod
+    async def find_resumable(stale_before: datetime):
+        """Documents whose ingestion has not finished: pending, or processing with a stale heartbeat."""
+        cursor = DocumentModel.collection.find(
+            {"$or": [
+                {"status": "pending"},
+                {"status": "processing", "updated_at": {"$lt": stale_before}}
+            ]},
+            {"_id": 1, "company_id": 1}
+        ).sort("uploaded_at", 1)
+        return await cursor.to_list(length=None)
+    
     @staticmethod
     async def get_all(company_id: Optional[str] = None):
         """Get all documents, optionally filtered by company."""
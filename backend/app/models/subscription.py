@@ -13,6 +13,7 @@ SUBSCRIPTION_TIERS: Dict[str, Dict[str, Any]] = {
         "vector_dimensions": 384,  # Lightweight, fast embeddings
         "embedding_model": "all-MiniLM-L6-v2",
         "max_documents": 20,
+        "max_pdf_pages": 300,  # Pages indexed per PDF
         "max_queries_per_month": 5000,
         "max_employees": 50,
         "analytics_enabled": False,
@@ -27,6 +28,7 @@ SUBSCRIPTION_TIERS: Dict[str, Dict[str, Any]] = {
         "vector_dimensions": 768,  # Balanced accuracy for technical docs
         "embedding_model": "BAAI/bge-base-en-v1.5",
         "max_documents": 100,
+        "max_pdf_pages": 1500,
         "max_queries_per_month": 25000,
         "max_employees": 200,
         "analytics_enabled": True,
@@ -41,6 +43,7 @@ SUBSCRIPTION_TIERS: Dict[str, Dict[str, Any]] = {
         "vector_dimensions": 1024,  # Maximum quality for specialized content
         "embedding_model": "BAAI/bge-large-en-v1.5",
         "max_documents": -1,  # Unlimited
+        "max_pdf_pages": -1,  # Unlimited
         "max_queries_per_month": -1,  # Unlimited
         "max_employees": -1,  # Unlimited
         "analytics_enabled": True,
@@ -110,3 +113,9 @@ def get_tier_model(tier_id: str) -> str:
     """Get embedding model name for a subscription tier."""
     tier = get_tier_features(tier_id)
     return tier.get("embedding_model", "all-MiniLM-L6-v2")  # Default to starter
+
+
+def get_tier_pdf_page_limit(tier_id: str) -> int:
+    """Get the number of pages indexed per PDF for a tier (-1 = unlimited)."""
+    tier = get_tier_features(tier_id)
+    return tier.get("max_pdf_pages", -1)
@@ -0,0 +1,149 @@
+"""
+Micro-batching Service
+Coalesces model calls from concurrent requests into batched inference.
+
+Callers submit a group of items from the event loop; a dedicated worker
+thread collects groups for up to ``max_wait_ms`` (or until ``max_batch_size``
+items are queued), runs one batched model call off the event loop and
+resolves each caller's future with its own slice of the results.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger("corpwise.batching")
+
+
+def _resolve(fut: asyncio.Future, result: Any = None, error: Exception = None):
+    # Runs on the caller's event loop; the caller may have given up already
+    if fut.cancelled():
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+
+class MicroBatcher:
+    """In-process batching queue in front of a synchronous batch function."""
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._max_seen = 0
+        self._last_batch_size = 0
+        self._busy_ms = 0.0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"batcher-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """Queue a group of items and wait for their results (same order)."""
+        if not items:
+            return []
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.put((list(items), loop, fut))
+        return await fut
+
+    def _collect(self, carry):
+        """Block for the first group, then gather more until the batch is full or the wait expires."""
+        groups = [carry] if carry is not None else [self._queue.get()]
+        size = len(groups[0][0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                group = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if size + len(group[0]) > self.max_batch_size:
+                # Never split a caller's group: hold it for the next batch
+                return groups, group
+            groups.append(group)
+            size += len(group[0])
+
+        return groups, None
+
+    def _run(self):
+        carry = None
+        while True:
+            groups, carry = self._collect(carry)
+            flat = [item for items, _, _ in groups for item in items]
+
+            start = time.perf_counter()
+            try:
+                results = list(self.process_batch(flat))
+                error = None
+            except Exception as e:
+                logger.exception(f"[BATCH:{self.name}] batch of {len(flat)} failed")
+                results, error = None, e
+            elapsed = (time.perf_counter() - start) * 1000
+
+            self._batches += 1
+            self._items += len(flat)
+            self._requests += len(groups)
+            self._last_batch_size = len(flat)
+            self._max_seen = max(self._max_seen, len(flat))
+            self._busy_ms += elapsed
+
+            offset = 0
+            for items, loop, fut in groups:
+                part = None if error is not None else results[offset:offset + len(items)]
+                offset += len(items)
+                try:
+                    loop.call_soon_threadsafe(_resolve, fut, part, error)
+                except RuntimeError:
+                    # The caller's event loop is closed: nobody is waiting for this group
+                    logger.debug(f"[BATCH:{self.name}] dropped result for a closed event loop")
+
+            logger.debug(
+                f"[BATCH:{self.name}] size={len(flat)} requests={len(groups)} "
+                f"latency={elapsed:.2f}ms queue_depth={self._queue.qsize()}"
+            )
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self._batches,
+            "items": self._items,
+            "requests": self._requests,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+            "last_batch_size": self._last_batch_size,
+            "max_batch_size_seen": self._max_seen,
+            "avg_batch_latency_ms": round(self._busy_ms / self._batches, 2) if self._batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
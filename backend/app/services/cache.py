@@ -1,9 +1,196 @@
+import os
+import time
+import asyncio
+import logging
+from collections import Counter, OrderedDict
 from datetime import datetime
+
+import numpy as np
+from bson import Binary
+from pymongo import UpdateOne
+
 from app.db.mongodb import db
 from app.services.hash import sha256_hash
+from app.services.embeddings import embed_text, embed_texts
+
+logger = logging.getLogger("corpwise.cache")
 
 response_cache = db.response_cache
 
+# In-process L1 in front of Mongo, keyed by (company_id, question_hash)
+RESPONSE_L1_SIZE = int(os.getenv("RESPONSE_L1_SIZE", "5000"))
+RESPONSE_L1_TTL_S = float(os.getenv("RESPONSE_L1_TTL_S", "60"))
+HIT_COUNT_FLUSH_S = float(os.getenv("HIT_COUNT_FLUSH_S", "30"))
+
+# Semantic (near-duplicate) layer behind the exact-hash lookup
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_DIMENSIONS = 384
+SEMANTIC_INDEX_TTL_S = float(os.getenv("SEMANTIC_INDEX_TTL_S", "300"))
+
+
+def _tenant_filter(company_id: str = None):
+    # Ensure cache is isolated by company
+    return company_id if company_id else {"$in": [None, ""]}
+
+
+def _tenant_key(company_id: str = None) -> str:
+    return (company_id or "").lower()
+
+
+# =====================================================
+# L1: bounded TTL/LRU cache of lookup results (hits and misses)
+# =====================================================
+_l1: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, doc or None)
+_l1_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_pending_hits: Counter = Counter()
+_MISSING = object()
+
+
+def _l1_get(key: tuple):
+    entry = _l1.get(key)
+    if entry is None:
+        return _MISSING
+    expires_at, doc = entry
+    if expires_at < time.monotonic():
+        del _l1[key]
+        return _MISSING
+    _l1.move_to_end(key)
+    return doc
+
+
+def _l1_put(key: tuple, doc):
+    _l1[key] = (time.monotonic() + RESPONSE_L1_TTL_S, doc)
+    _l1.move_to_end(key)
+    while len(_l1) > RESPONSE_L1_SIZE:
+        _l1.popitem(last=False)
+
+
+def invalidate_tenant_cache(company_id: str = None):
+    """
+    Drop this worker's in-process cache state for a tenant.
+    Called whenever the tenant's corpus changes (upload/delete) or a new answer is cached.
+    """
+    tenant = _tenant_key(company_id)
+    for key in [k for k in _l1 if k[0] == tenant]:
+        del _l1[key]
+    _semantic_indexes.pop(tenant, None)
+    _l1_stats["invalidations"] += 1
+
+
+async def flush_hit_counts():
+    """Write the hit counts aggregated in memory back to Mongo in one bulk write."""
+    if not _pending_hits:
+        return
+    pending = dict(_pending_hits)
+    _pending_hits.clear()
+    try:
+        await response_cache.bulk_write(
+            [UpdateOne({"_id": doc_id}, {"$inc": {"hit_count": n}}) for doc_id, n in pending.items()],
+            ordered=False
+        )
+    except Exception:
+        # Keep the counts for the next flush
+        _pending_hits.update(pending)
+        raise
+
+
+async def run_hit_count_flusher():
+    """Background task: flush hit counts every HIT_COUNT_FLUSH_S (and once more on cancel)."""
+    try:
+        while True:
+            await asyncio.sleep(HIT_COUNT_FLUSH_S)
+            try:
+                await flush_hit_counts()
+            except Exception as e:
+                logger.warning(f"[CACHE] hit count flush failed: {e}")
+    finally:
+        await flush_hit_counts()
+
+
+# =====================================================
+# Per-tenant question embedding index (in-process)
+# =====================================================
+class _TenantIndex:
+    """Normalized question embeddings of one tenant's cached answers."""
+
+    def __init__(self, ids: list, matrix: np.ndarray):
+        self.ids = ids
+        self.matrix = matrix
+        self.loaded_at = time.monotonic()
+
+    def add(self, doc_id, vec: np.ndarray):
+        self.ids.append(doc_id)
+        self.matrix = np.vstack([self.matrix, vec[None, :]])
+
+    def best_match(self, vec: np.ndarray):
+        if not self.ids:
+            return None, 0.0
+        sims = self.matrix @ vec
+        i = int(np.argmax(sims))
+        return self.ids[i], float(sims[i])
+
+
+_semantic_indexes: dict[str, _TenantIndex] = {}
+_semantic_stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+
+def _question_text(question: str) -> str:
+    return question.strip().lower()
+
+
+async def _load_tenant_index(company_id: str = None) -> _TenantIndex:
+    """Build the tenant's index from Mongo, backfilling embeddings for legacy entries."""
+    docs = await response_cache.find(
+        {"company_id": _tenant_filter(company_id)},
+        {"_id": 1, "question": 1, "question_embedding": 1}
+    ).to_list(length=None)
+
+    legacy = [d for d in docs if "question_embedding" not in d and d.get("question")]
+    if legacy:
+        vectors = await embed_texts(
+            [_question_text(d["question"]) for d in legacy], dimensions=SEMANTIC_CACHE_DIMENSIONS
+        )
+        for d, v in zip(legacy, vectors):
+            vec = np.asarray(v, dtype=np.float32)
+            d["question_embedding"] = Binary(vec.tobytes())
+            await response_cache.update_one(
+                {"_id": d["_id"]}, {"$set": {"question_embedding": d["question_embedding"]}}
+            )
+
+    ids, rows = [], []
+    for d in docs:
+        if "question_embedding" in d:
+            ids.append(d["_id"])
+            rows.append(np.frombuffer(d["question_embedding"], dtype=np.float32))
+
+    matrix = np.vstack(rows) if rows else np.empty((0, SEMANTIC_CACHE_DIMENSIONS), dtype=np.float32)
+    return _TenantIndex(ids, matrix)
+
+
+async def _get_tenant_index(company_id: str = None) -> _TenantIndex:
+    key = _tenant_key(company_id)
+    index = _semantic_indexes.get(key)
+    # Reload periodically so entries cached by other workers become visible
+    if index is None or time.monotonic() - index.loaded_at > SEMANTIC_INDEX_TTL_S:
+        index = await _load_tenant_index(company_id)
+        _semantic_indexes[key] = index
+    return index
+
+
+def semantic_cache_metrics() -> dict:
+    return {
+        **_semantic_stats,
+        "l1_hits": _l1_stats["hits"],
+        "l1_misses": _l1_stats["misses"],
+        "l1_entries": len(_l1),
+        "l1_invalidations": _l1_stats["invalidations"],
+        "pending_hit_counts": sum(_pending_hits.values()),
+        "threshold": SEMANTIC_CACHE_THRESHOLD,
+        "tenants_indexed": len(_semantic_indexes),
+        "entries_indexed": sum(len(i.ids) for i in _semantic_indexes.values()),
+    }
+
 
 # =====================================================
 # Get cached response (ASYNC)
@@ -13,22 +200,51 @@ response_cache = db.response_cache
 # =====================================================
 async def get_cached_response(question: str, company_id: str = None):
     q_hash = sha256_hash(question)
-    
-    # Ensure cache is isolated by company
-    query = {"question_hash": q_hash}
-    if company_id:
-        query["company_id"] = company_id
+    key = (_tenant_key(company_id), q_hash)
+
+    # L1: popular questions (and recent misses) never touch the database
+    cached = _l1_get(key)
+    if cached is _MISSING:
+        _l1_stats["misses"] += 1
+        cached = await _lookup_cached_response(question, q_hash, company_id)
+        _l1_put(key, cached)
     else:
-        query["company_id"] = {"$in": [None, ""]}
+        _l1_stats["hits"] += 1
 
-    cached = await response_cache.find_one(query)
     if not cached:
         return None
 
-    await response_cache.update_one(
-        {"_id": cached["_id"]},
-        {"$inc": {"hit_count": 1}}
-    )
+    # Aggregated in memory, flushed periodically by run_hit_count_flusher
+    _pending_hits[cached["_id"]] += 1
+
+    return cached
+
+
+async def _lookup_cached_response(question: str, q_hash: str, company_id: str = None):
+    # Fast path: exact question hash
+    query = {"question_hash": q_hash, "company_id": _tenant_filter(company_id)}
+
+    cached = await response_cache.find_one(query)
+
+    if cached:
+        _semantic_stats["exact_hits"] += 1
+    elif SEMANTIC_CACHE_ENABLED:
+        # Near-duplicate: nearest cached question within the tenant
+        index = await _get_tenant_index(company_id)
+        if index.ids:
+            vec = np.asarray(
+                await embed_text(_question_text(question), dimensions=SEMANTIC_CACHE_DIMENSIONS),
+                dtype=np.float32
+            )
+            doc_id, similarity = index.best_match(vec)
+            if similarity >= SEMANTIC_CACHE_THRESHOLD:
+                cached = await response_cache.find_one({"_id": doc_id})
+                if cached:
+                    _semantic_stats["semantic_hits"] += 1
+                    print(f"🧠 SEMANTIC CACHE HIT | sim={similarity:.3f} | '{question}' ≈ '{cached.get('question')}'")
+
+    if not cached:
+        _semantic_stats["misses"] += 1
 
     return cached
 
@@ -40,9 +256,15 @@ async def store_response(question, answer, sources, confidence, company_id: str
     if not answer or "temporarily unable" in answer.lower():
         return
 
-    await response_cache.insert_one({
+    vec = np.asarray(
+        await embed_text(_question_text(question), dimensions=SEMANTIC_CACHE_DIMENSIONS),
+        dtype=np.float32
+    )
+
+    result = await response_cache.insert_one({
         "question_hash": sha256_hash(question),
         "question": question,
+        "question_embedding": Binary(vec.tobytes()),
         "answer": answer,
         "sources": sources,
         "confidence": confidence,
@@ -50,3 +272,11 @@ async def store_response(question, answer, sources, confidence, company_id: str
         "hit_count": 1,
         "created_at": datetime.utcnow()
     })
+
+    # Cached misses for this tenant may now match the new entry
+    for k in [k for k in _l1 if k[0] == _tenant_key(company_id) and _l1[k][1] is None]:
+        del _l1[k]
+
+    index = _semantic_indexes.get(_tenant_key(company_id))
+    if index is not None:
+        index.add(result.inserted_id, vec)
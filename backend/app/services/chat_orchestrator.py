@@ -1,24 +1,33 @@
 from datetime import datetime
 from collections import Counter
+import hashlib
 import logging
 import asyncio
+import os
+
+import numpy as np
 
 from app.services.intent import detect_intent
 from app.services.system_answers import get_system_answer
 from app.services.memory import get_recent_messages
 from app.services.cache import get_cached_response, store_response
 from app.db.mongodb import db
-from app.services.keyword_retriever import keyword_search
+from app.services.keyword_retriever import keyword_search, term_idf
 from app.services.cross_encoder_reranker import cross_encoder_rerank
+from app.services.fusion import fuse, diversify
 from app.services.confidence import compute_chunk_confidence
 from app.services.negative_logger import log_negative_retrieval
-from app.services.llm.gemini_client import generate_gemini_response
+from app.services.llm.gemini_client import generate_gemini_response, stream_gemini_response
 from app.services.context_compressor import compress_chunk
 from app.services.answer_calibrator import calibrate_answer
 from app.services.llm.prompts import SAFE_REWRITE_PROMPT
 from app.services.lingo import translate
-from app.db.pinecone_client import get_index
-from app.services.embeddings import embed_text
+from app.services.vector_store import get_vector_store, supports_hybrid
+from app.services.sparse_encoder import HYBRID_ALPHA, hybrid_scale, encode_query as encode_sparse_query
+from app.services.embeddings import embed_text, embed_texts
+from app.services.single_flight import SingleFlight
+from app.services.tenant_profile import resolve_tenant_tier
+from app.services.metering import release_query
 
 
 # =====================================================
@@ -31,6 +40,48 @@ MIN_CONTEXT_TOKENS = 120
 
 REFUSAL_MESSAGE = "I do not have sufficient internal information to answer this question."
 
+# Budget shared by every independent stage of one request (cache, history, retrieval)
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "10"))
+# Own budget of the optional MMR-vector stage; on timeout diversity falls back to sources
+MMR_VECTORS_TIMEOUT_S = float(os.getenv("MMR_VECTORS_TIMEOUT_S", "0.3"))
+
+
+# =====================================================
+# Concurrent Stage Fan-out
+# =====================================================
+def request_deadline() -> float:
+    """Absolute event-loop time by which all fan-out stages of a request must finish."""
+    return asyncio.get_running_loop().time() + REQUEST_DEADLINE_S
+
+
+async def await_stage(aw, deadline: float, default=None, name: str = "stage", required: bool = False):
+    """
+    Await one fan-out stage against the shared request deadline.
+
+    Optional stages degrade to ``default`` on timeout or failure so a slow
+    cache/history/keyword backend never fails the whole request. Required
+    stages re-raise, letting the caller's fallback path handle it.
+    """
+    remaining = max(deadline - asyncio.get_running_loop().time(), 0)
+    try:
+        return await asyncio.wait_for(aw, timeout=remaining)
+    except asyncio.TimeoutError:
+        logger.warning(f"[FANOUT] {name} exceeded request deadline")
+        if required:
+            raise
+        return default
+    except Exception as e:
+        if required:
+            raise
+        logger.warning(f"[FANOUT] {name} failed: {e}")
+        return default
+
+
+def cancel_pending(*tasks):
+    for t in tasks:
+        if t is not None and not t.done():
+            t.cancel()
+
 
 # =====================================================
 # Semantic Retrieval (Pinecone ONLY)
@@ -38,22 +89,40 @@ REFUSAL_MESSAGE = "I do not have sufficient internal information to answer this
 # =====================================================
 # Semantic Retrieval (Pinecone ONLY)
 # =====================================================
-async def semantic_search(query: str, company_id: str, top_k: int = 15):
-    index = get_index()
-    query_vector = await embed_text(query)
+async def semantic_search(query: str, company_id: str, top_k: int = 15, alpha: float = None):
+    """
+    Dense search in the tenant's tier index. With ``alpha`` set, one
+    sparse-dense hybrid query instead: dense weighted by alpha, BM25-style
+    sparse term weights by 1 - alpha.
+    """
+    # Query the index (and embedding model) the tenant's tier indexes documents with
+    tier = await resolve_tenant_tier(company_id)
+    store = get_vector_store(tier.dimensions)
+    query_vector = await embed_text(query, dimensions=tier.dimensions)
+
+    sparse_vector = None
+    if alpha is not None:
+        try:
+            idf = await term_idf(query, company_id)
+        except Exception as e:
+            logger.warning(f"[HYBRID] term IDF unavailable, weighting query terms uniformly: {e}")
+            idf = None
+        query_vector, sparse_vector = hybrid_scale(query_vector, encode_sparse_query(query, idf), alpha)
 
     # CRITICAL: Use namespace for isolation
     # If company_id is None, it defaults to global/'' namespace
     namespace = company_id if company_id else ""
     
-    print(f"🌲 PINECONE QUERY | Namespace: '{namespace}' | Top_K: {top_k} | Query: '{query}'")
+    print(f"🌲 PINECONE QUERY | Index: {tier.index_name} | Namespace: '{namespace}' | Top_K: {top_k} | Alpha: {alpha} | Query: '{query}'")
 
     results = await asyncio.to_thread(
-        index.query,
+        store.query,
         vector=query_vector,
         top_k=top_k,
         include_metadata=True,
-        namespace=namespace 
+        include_values=True,  # Candidate vectors feed MMR selection in retrieve_context
+        namespace=namespace,
+        sparse_vector=sparse_vector
     )
 
     print(f"🌲 PINECONE RESULTS: {len(results.get('matches', []))} matches found.")
@@ -61,6 +130,8 @@ async def semantic_search(query: str, company_id: str, top_k: int = 15):
     chunks = []
     MIN_SEMANTIC_SCORE = 0.25
     MIN_UPLOADED_DOC_SCORE = 0.20  # Lower threshold for uploaded docs
+    # Hybrid scores carry the dense similarity scaled by alpha (the sparse cosine, in [0, 1], only adds)
+    threshold_scale = alpha if alpha is not None else 1.0
 
     for match in results.get("matches", []):
         meta = match.get("metadata", {})
@@ -68,7 +139,7 @@ async def semantic_search(query: str, company_id: str, top_k: int = 15):
         
         # Use lower threshold for uploaded documents
         has_doc_id = meta.get("doc_id")
-        threshold = MIN_UPLOADED_DOC_SCORE if has_doc_id else MIN_SEMANTIC_SCORE
+        threshold = (MIN_UPLOADED_DOC_SCORE if has_doc_id else MIN_SEMANTIC_SCORE) * threshold_scale
 
         print(f"   - Match: {meta.get('source', 'Unknown')} | Score: {score:.4f} | DocID: {meta.get('doc_id')}")
 
@@ -83,27 +154,26 @@ async def semantic_search(query: str, company_id: str, top_k: int = 15):
                 "doc_id": meta.get("doc_id"),
                 "doc_type": meta.get("doc_type"),
                 "score": score,
-                "type": "semantic"
+                "type": "semantic",
+                "vector": match.get("values") or None
             })
 
     return chunks
 
 
-def diversify_chunks(chunks, max_per_source=1, max_total=6):
-    seen = {}
-    diversified = []
-
-    for c in chunks:
-        src = c["source"]
-        seen[src] = seen.get(src, 0) + 1
-
-        if seen[src] <= max_per_source:
-            diversified.append(c)
-
-        if len(diversified) >= max_total:
-            break
-
-    return diversified
+async def candidate_vectors(chunks: list[dict], company_id: str) -> np.ndarray:
+    """
+    Embedding matrix for MMR: vectors returned by the store, with the rest
+    (keyword hits) filled from the embedding cache. Consumes ``chunk["vector"]``.
+    """
+    vectors = [c.pop("vector", None) for c in chunks]
+    missing = [i for i, v in enumerate(vectors) if not v]
+    if missing:
+        tier = await resolve_tenant_tier(company_id)
+        filled = await embed_texts([chunks[i]["text"] for i in missing], dimensions=tier.dimensions)
+        for i, v in zip(missing, filled):
+            vectors[i] = v
+    return np.asarray(vectors, dtype=np.float32)
 
 
 # ... (contextualize_query and normalize_query skipped for brevity - no changes needed) ...
@@ -113,48 +183,54 @@ def diversify_chunks(chunks, max_per_source=1, max_total=6):
 # =====================================================
 # Hybrid Retrieval
 # =====================================================
-async def retrieve_context(query: str, company_id: str, top_k: int = 15):  # Added company_id
+async def retrieve_context(query: str, company_id: str, top_k: int = 15, deadline: float = None):  # Added company_id
     CE_SKIP_TOP_NORM = 0.85
     CE_SKIP_GAP = 0.15
 
+    if deadline is None:
+        deadline = request_deadline()
+
     # 🧹 STEP 0: Normalize query to remove company name bias
     normalized_query = normalize_query(query)
     
     # 🧠 Query is already contextualized by process_chat
     expanded_query = normalized_query
 
-    # Pass company_id to semantic search
-    semantic_chunks = await semantic_search(expanded_query, company_id, top_k)
-    
-    # Keyword search currently doesn't support namespace (MongoDB). 
-    # TODO: Add company_id filter to MongoDB keyword search if needed.
-    # For now, we assume keyword search is global or less critical for tenant isolation, 
-    # OR we need to update keyword_search too. (Safe to leave as is for this step, focus on Vectors)
-    keyword_chunks = await keyword_search(expanded_query, company_id=company_id, limit=3) 
-
-    all_chunks = semantic_chunks + keyword_chunks
-    if not all_chunks:
-        return "", [], [], False
+    hybrid = HYBRID_ALPHA is not None
+    if hybrid:
+        # Pinecone indexes take sparse values only with the dotproduct metric (looked up once)
+        tier = await resolve_tenant_tier(company_id)
+        hybrid = await asyncio.to_thread(supports_hybrid, dimensions=tier.dimensions)
 
-    semantic_scores = normalize([c["score"] for c in semantic_chunks])
-    keyword_scores = normalize([c["score"] for c in keyword_chunks]) if keyword_chunks else []
-    
-    for i, c in enumerate(semantic_chunks):
-        c["norm_score"] = semantic_scores[i] * 0.6
-        
-        # 🚀 BOOST: Prioritize UPLOADED documents by 400% (5x multiplier)
-        has_doc_id = c.get("doc_id")
-        if has_doc_id:
-            c["norm_score"] *= 1.5  
-            print(f"✨ BOOSTED (1.5x): {c['source']} (doc_id: {has_doc_id})")
-        else:
-            print(f"📄 Regular: {c['source']} (no doc_id)")
+    if hybrid:
+        # One sparse-dense query covers both the semantic and the lexical side
+        semantic_chunks = await await_stage(
+            semantic_search(expanded_query, company_id, top_k, alpha=HYBRID_ALPHA), deadline, name="hybrid", required=True
+        )
+        keyword_chunks = []
+    else:
+        # Semantic (embedding + vector store) and keyword (BM25) search are independent:
+        # run them concurrently so latency is max(stage) instead of sum(stage).
+        # Keyword search is best-effort; a semantic failure propagates to the caller's fallback.
+        semantic_chunks, keyword_chunks = await asyncio.gather(
+            await_stage(semantic_search(expanded_query, company_id, top_k), deadline, name="semantic", required=True),
+            await_stage(keyword_search(expanded_query, company_id=company_id, limit=3), deadline, [], name="keyword"),
+        )
 
-    for i, c in enumerate(keyword_chunks):
-        c["norm_score"] = keyword_scores[i] * 0.4
+    # Weighted (or RRF) fusion with the uploaded-document boost, then MMR selection
+    ranked = fuse({"semantic": semantic_chunks, "keyword": keyword_chunks})
+    if not ranked:
+        return "", [], [], False
 
-    ranked = sorted(all_chunks, key=lambda x: x["norm_score"], reverse=True)
-    candidates = diversify_chunks(ranked)
+    # MMR over the candidates' embeddings; degrade to same-source redundancy if they
+    # can't be had quickly (the stage never spends the rest of the request budget)
+    mmr_deadline = min(deadline, asyncio.get_running_loop().time() + MMR_VECTORS_TIMEOUT_S)
+    vectors = await await_stage(candidate_vectors(ranked, company_id), mmr_deadline, name="mmr-vectors")
+    if vectors is None:
+        for c in ranked:
+            c.pop("vector", None)
+    candidates = diversify(ranked, vectors=vectors)
+    print(f"🔀 FUSION: {len(semantic_chunks)} semantic + {len(keyword_chunks)} keyword → {len(ranked)} unique → {len(candidates)} candidates")
 
     skip_ce = False
     if candidates and candidates[0]["norm_score"] >= CE_SKIP_TOP_NORM:
@@ -167,7 +243,7 @@ async def retrieve_context(query: str, company_id: str, top_k: int = 15):  # Add
         top_chunks = candidates[:3]
         ce_used = False
     else:
-        reranked = cross_encoder_rerank(query=query, chunks=candidates, top_k=3)
+        reranked = await cross_encoder_rerank(query=query, chunks=candidates, top_k=3)
         if not reranked or reranked[0].get("ce_score", 0) < CE_MIN_SCORE:
             top_chunks = ranked[:3]
             ce_used = False
@@ -256,6 +332,9 @@ def build_prompt(messages: list[dict], context: str, company_id: str = None) ->
 # =====================================================
 # Main Orchestrator
 # =====================================================
+DIRECT_INTENTS = ["SYSTEM_INFO", "GREETING", "DATE_TIME"]
+
+
 def contextualize_query(query: str, history: list[dict]) -> str:
     """
     Rewrite the query to be self-contained based on conversation history.
@@ -282,16 +361,64 @@ def normalize_query(query: str) -> str:
         return ""
     return query.lower().strip()
 
-async def process_chat(user_id: str, conversation_id: str, question: str, company_id: str = None, original_language: str = "en"):
-    cached = False  # Initialize default
+
+def build_direct_context(intent: str) -> str:
+    """Context for intents answered without retrieval (system info, greetings, date/time)."""
+    context = f"Current Date/Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+
+    if intent == "SYSTEM_INFO":
+        context += "User is asking about CORPWISE system identity."
+    elif intent == "GREETING":
+        context += "User is greeting you. Be polite and professional."
+    elif intent == "DATE_TIME":
+        context += "User is asking for current date/time."
+
+    return context
+
+
+def generation_failure_reply(e: Exception) -> tuple[str, str]:
+    """Map an LLM failure to a user-facing (answer, confidence) pair."""
+    # If LLM fails (e.g. Rate Limit 429), fall back gracefully
+    if "429" in str(e) or "ResourceExhausted" in str(e):
+        # Do NOT dump raw context here, it confuses users.
+        return "⚠️ System is busy (Rate Limit). Please try again in a minute.", "low"
+
+    logger.error(f"LLM Generation failed: {e}")
+    return "I found some info but couldn't process it. Please check the sources.", "low"
+
+
+async def prepare_turn(conversation_id: str, question: str, company_id: str = None, original_language: str = "en",
+                       history: list[dict] = None) -> dict:
+    """
+    Run every stage of a chat turn up to (but not including) LLM generation.
+
+    ``history`` is the conversation's recent messages if the caller already
+    has them; otherwise they are fetched alongside the other stages.
+
+    Returns a turn dict. When ``turn["prompt"]`` is set the caller must generate
+    the answer from it and pass the raw text to ``complete_turn``; otherwise
+    ``turn["reply"]`` is already final.
+    """
+    turn = {
+        "mode": "empty",
+        "question": question,
+        "company_id": company_id,
+        "original_language": original_language,
+        "prompt": None,
+        "context": "",
+        "reply": None,
+        "sources": [],
+        "confidence": "low",
+        "answer_conf_score": 0.0,
+        "chunks": [],
+        "ce_used": False,
+        "cached": False,
+        "persist": False,
+    }
 
     if not question or not question.strip():
-        return {
-            "reply": "Please ask a valid question.",
-            "sources": [],
-            "confidence": "low",
-            "cached": False
-        }
+        turn["reply"] = "Please ask a valid question."
+        return turn
 
     # Detect Intent
     intent = detect_intent(question)
@@ -300,37 +427,42 @@ async def process_chat(user_id: str, conversation_id: str, question: str, compan
     # FORCE LOWERCASE COMPANY ID for consistency
     if company_id:
         company_id = company_id.lower()
+        turn["company_id"] = company_id
     
     # 🌍 Lingo input translation
     translated_question = question # await translate(question, "en") if original_language != "en" else question
-
-    final_answer = None
-    final_confidence = "low"
-    cached = False
+    turn["translated_question"] = translated_question
 
     # --------------------
     # Conversational Query Detection
     # --------------------
     if is_conversational_query(translated_question):
         # Handle greetings and small talk without retrieval
-        history = await get_recent_messages(conversation_id)
+        if history is None:
+            history = await get_recent_messages(conversation_id)
         messages = history + [{"role": "user", "content": translated_question}]
         
         # Simple conversational prompt (no context needed)
-        conversational_prompt = build_prompt(messages, "")
-        
-        final_answer = generate_gemini_response(conversational_prompt).strip()
-        final_confidence = "high"
-        sources = []
-        
-        # Return conversational response directly
         # (Message history is managed elsewhere in the system)
-        return {
-            "reply": final_answer,
-            "sources": sources,
-            "confidence": final_confidence,
-            "cached": False
-        }
+        turn["mode"] = "conversational"
+        turn["prompt"] = build_prompt(messages, "")
+        turn["confidence"] = "high"
+        return turn
+
+    # --------------------
+    # Fan-out: cache lookup, history and retrieval are independent, so they
+    # all start now and are awaited against one shared request deadline.
+    # Retrieval starts speculatively on the raw question and is discarded on a cache hit.
+    # --------------------
+    deadline = request_deadline()
+
+    # Fetch history for ALL intents (needed for context construction)
+    history_task = asyncio.create_task(get_recent_messages(conversation_id)) if history is None else None
+    retrieval_task = None
+    if intent not in DIRECT_INTENTS:
+        retrieval_task = asyncio.create_task(
+            retrieve_context(translated_question, company_id=company_id, deadline=deadline)
+        )
 
     # --------------------
     # Cache check (language-agnostic)
@@ -338,258 +470,173 @@ async def process_chat(user_id: str, conversation_id: str, question: str, compan
     if intent != "SYSTEM_INFO":
         # Normalize query for cache to avoid company name bias
         normalized_cache_query = normalize_query(translated_question)
-        cached_response = await get_cached_response(normalized_cache_query, company_id=company_id)
+        cached_response = await await_stage(
+            get_cached_response(normalized_cache_query, company_id=company_id), deadline, name="cache"
+        )
         if cached_response:
-            return {
-                "reply": await translate(cached_response["answer"], original_language),
-                "sources": cached_response["sources"],
-                "confidence": cached_response["confidence"],
-                "cached": True
-            }
+            cancel_pending(history_task, retrieval_task)
+            turn["mode"] = "cached"
+            turn["reply"] = await translate(cached_response["answer"], original_language)
+            turn["sources"] = cached_response["sources"]
+            turn["confidence"] = cached_response["confidence"]
+            turn["cached"] = True
+            return turn
+
+    turn["persist"] = True
+    prefetched_history = history
+    history = []
 
     try:
-        # Fetch history for ALL intents (needed for context construction)
-        history = await get_recent_messages(conversation_id)
+        if history_task is not None:
+            history = await await_stage(history_task, deadline, [], name="history")
+        else:
+            history = prefetched_history
+        messages = history + [{"role": "user", "content": translated_question}]
 
         # --------------------
         # Non-Retrieval Intents
         # --------------------
         # REMOVED "GENERAL" from here to ensure broader queries hit the RAG system
-        if intent in ["SYSTEM_INFO", "GREETING", "DATE_TIME"]:
+        if intent in DIRECT_INTENTS:
             # Basic conversational or system queries - No RAG needed
-            context = f"Current Date/Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            
-            if intent == "SYSTEM_INFO":
-                context += "User is asking about CORPWISE system identity."
-            elif intent == "GREETING":
-                context += "User is greeting you. Be polite and professional."
-            elif intent == "DATE_TIME":
-                context += "User is asking for current date/time."
-                
-            messages = history + [{"role": "user", "content": translated_question}]
-            
-            # Simple prompt for non-RAG
-            prompt = build_prompt(messages, context, company_id=company_id)
-            
             # We skip retrieval and force generation
-            raw = generate_gemini_response(prompt)
-            final_answer = raw.strip()
-            final_confidence = "high"
-            sources = []
-            
-            # Skip the rest (RAG flow) and go to return
-            ce_used = False
-            answer_conf_score = 1.0
+            turn["mode"] = "direct"
+            turn["prompt"] = build_prompt(messages, build_direct_context(intent), company_id=company_id)
+            turn["confidence"] = "high"
+            turn["answer_conf_score"] = 1.0
+            return turn
 
+        # --------------------
+        # RAG Retrieval Flow
+        # --------------------
+        # 🧠 Rewrite query with context (e.g. "it" -> "Project Phoenix")
+        contextualized_q = contextualize_query(translated_question, history)
+        if contextualized_q != translated_question:
+            # The speculative retrieval used the raw question; redo it with the rewrite
+            cancel_pending(retrieval_task)
+            retrieval_task = asyncio.create_task(
+                retrieve_context(contextualized_q, company_id=company_id, deadline=deadline)
+            )
+        
+        # PASSING COMPANY_ID TO RETRIEVAL
+        context, sources, chunks, ce_used = await retrieval_task
+
+        # 🛠️ AGGRESSIVE FILTERING REMOVED
+        # The previous filters (filter_chunks_by_query, restrict_chunks_by_intent) were too strict
+        # and caused "No information found" errors for semantic matches.
+        # chunks = filter_chunks_by_query(chunks, translated_question)
+        # chunks = dominant_chunks(chunks)
+        # chunks = restrict_chunks_by_intent(chunks, intent)
+
+        # 🔁 rebuild context + sources after filtering
+        context = "\n\n".join(compress_chunk(c["text"]) for c in chunks)
+        sources = dominant_sources(chunks)
+
+        answer_conf_score = aggregate_answer_confidence(chunks)
+        confidence = confidence_label(answer_conf_score)
+
+        turn.update({
+            "mode": "rag",
+            "context": context,
+            "sources": sources,
+            "chunks": chunks,
+            "ce_used": any("ce_score" in c for c in chunks),
+            "answer_conf_score": answer_conf_score,
+            "confidence": confidence,
+        })
+
+        # Always try LLM if we have context, unless confidence is extremely low
+        should_generate = context.strip() and answer_conf_score >= 0.4
+
+        if should_generate:
+            turn["prompt"] = build_prompt(messages, context, company_id=company_id)
+        elif confidence == "low":
+            turn["reply"] = REFUSAL_MESSAGE
+            turn["sources"] = []
         else:
-            # --------------------
-            # RAG Retrieval Flow
-            # --------------------
-            # history already fetched above
-            
-            # 🧠 Rewrite query with context (e.g. "it" -> "Project Phoenix")
-            contextualized_q = contextualize_query(translated_question, history)
-            
-            # PASSING COMPANY_ID TO RETRIEVAL
-            context, sources, chunks, ce_used = await retrieve_context(contextualized_q, company_id=company_id)
-
-            # 🛠️ RESTORING LEGACY FILTER LOGIC (As requested by user)
-            # These filters were previously removed but user reported better performance with them.
-            # UPDATE: Disabling again because strict intent filtering blocks valid queries like "What is CORPWISE chat?"
-            # chunks = filter_chunks_by_query(chunks, translated_question)
-            # chunks = dominant_chunks(chunks)
-            # chunks = restrict_chunks_by_intent(chunks, intent)
-
-            # 🔁 rebuild context + sources after filtering
-            context = "\n\n".join(compress_chunk(c["text"]) for c in chunks)
-            sources = dominant_sources(chunks)
+            # Fallback for when context exists but score < 0.4 (very rare with top_k=8)
+            turn["reply"] = "I found relevant documents but they might not fully answer your question. Please verify the sources below."
 
-            answer_conf_score = aggregate_answer_confidence(chunks)
-            confidence = confidence_label(answer_conf_score)
+    except Exception:
+        logger.exception("Chat retrieval failed")
+        cancel_pending(history_task, retrieval_task)
 
+        if intent in DIRECT_INTENTS + ["GENERAL"]:
+            # Retrieval is unavailable, but these intents can still be answered without RAG
             messages = history + [{"role": "user", "content": translated_question}]
-            prompt = build_prompt(messages, context, company_id=company_id)
+            turn["mode"] = "direct"
+            turn["prompt"] = build_prompt(messages, build_direct_context(intent), company_id=company_id)
+            turn["confidence"] = "high"
+            turn["answer_conf_score"] = 1.0
+            turn["sources"] = []
+        else:
+            turn["mode"] = "error"
+            turn["prompt"] = None
+            turn["reply"] = "I'm temporarily unable to access internal knowledge."
+            turn["confidence"] = "low"
+            turn["sources"] = []
 
-            ce_used = any("ce_score" in c for c in chunks)
+    return turn
 
-            # Always try LLM if we have context, unless confidence is extremely low
-            should_generate = context.strip() and answer_conf_score >= 0.4
-            
-            if should_generate:
-                try:
-                    raw = generate_gemini_response(prompt)
-                    final_answer, final_confidence = calibrate_answer(
-                        raw.strip(), context, answer_conf_score
-                    )
-                    final_answer = strip_disallowed_prefixes(final_answer)
-                except Exception as e:
-                    # If LLM fails (e.g. Rate Limit 429), fall back gracefully
-                    if "429" in str(e) or "ResourceExhausted" in str(e):
-                        final_answer = "⚠️ System is busy (Rate Limit). Please try again in a minute."
-                        final_confidence = "low" 
-                        # Do NOT dump raw context here, it confuses users.
-                    else:
-                        logger.error(f"LLM Generation failed: {e}")
-                        final_answer = "I found some info but couldn't process it. Please check the sources."
-                        final_confidence = "low"
-
-            else:
-                final_confidence = confidence
-                if confidence == "low":
-                    final_answer = REFUSAL_MESSAGE
-                    sources = []
-                else:
-                     # Fallback for when context exists but score < 0.4 (very rare with top_k=8)
-                     final_answer = "I found relevant documents but they might not fully answer your question. Please verify the sources below."
-
-            if final_confidence != "high":
-                await log_negative_retrieval(
-                    question=translated_question,
-                    confidence=final_confidence,
-                    answer_conf_score=answer_conf_score,
-                    ce_used=ce_used,
-                    top_ce_score=chunks[0].get("ce_score") if chunks else None,
-                    sources=sources,
-                )
-
-            # Automatic caching is DISABLED.
-            # Caching is now triggered via the /feedback endpoint upon positive user feedback.
-            # if final_confidence == "high":
-            #     await store_response(translated_question, final_answer, sources, final_confidence, company_id=company_id)
-
-    except Exception:
 
-        # --------------------
-        # Non-Retrieval Intents
-        # --------------------
-        if intent in ["SYSTEM_INFO", "GREETING", "DATE_TIME", "GENERAL"]:
-            # Basic conversational or system queries - No RAG needed
-            context = f"Current Date/Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            
-            if intent == "SYSTEM_INFO":
-                context += "User is asking about CORPWISE system identity."
-            elif intent == "GREETING":
-                context += "User is greeting you. Be polite and professional."
-            elif intent == "DATE_TIME":
-                context += "User is asking for current date/time."
-                
-            messages = history + [{"role": "user", "content": translated_question}]
-            
-            # Simple prompt for non-RAG
-            prompt = build_prompt(messages, context, company_id=company_id)
-            
-            # We skip retrieval and force generation
-            raw = generate_gemini_response(prompt)
-            final_answer = raw.strip()
-            final_confidence = "high"
-            sources = []
-            
-            # Skip the rest (RAG flow) and go to return
-            ce_used = False
-            answer_conf_score = 1.0
+def complete_turn(turn: dict, raw: str = None, error: Exception = None) -> None:
+    """Fill in the final reply/confidence of a turn from the raw LLM output (or its failure)."""
+    if error is not None:
+        turn["reply"], turn["confidence"] = generation_failure_reply(error)
+        turn["failed"] = True
+        return
 
-        else:
-            # --------------------
-            # RAG Retrieval Flow
-            # --------------------
-            # --------------------
-            # history already fetched above
-            
-            # 🧠 Rewrite query with context (e.g. "it" -> "Project Phoenix")
-            contextualized_q = contextualize_query(translated_question, history)
-            
-            # STEP 0: Normalize query to remove company name bias
-            # (Moved normalization inside retrieve_context, passing contextualized_q directly)
-            
-            # PASSING COMPANY_ID TO RETRIEVAL
-            context, sources, chunks, ce_used = await retrieve_context(contextualized_q, company_id=company_id)
+    raw = (raw or "").strip()
 
-            # 🛠️ AGGRESSIVE FILTERING REMOVED
-            # The previous filters (filter_chunks_by_query, restrict_chunks_by_intent) were too strict
-            # and caused "No information found" errors for semantic matches.
-            # We now rely on the vector store score and Cross-Encoder to filter bad chunks.
-            
-            # chunks = filter_chunks_by_query(chunks, translated_question) <--- REMOVED
-            # chunks = restrict_chunks_by_intent(chunks, intent) <--- REMOVED
-            
-            # Still keep dominant source filtering to avoid mixing too many disparate docs
-            # But relax it slightly or rely on re-ranking
-            # chunks = dominant_chunks(chunks) <--- OPTIONAL: Let's trust re-ranker more
-            
-            # 🔁 rebuild context + sources after potential filtering (if any remained)
-            # context = "\n\n".join(compress_chunk(c["text"]) for c in chunks)
-            # sources = dominant_sources(chunks)
-            
-            # Since retrieve_context ALREADY returns the top chunks (compressed), we don't need to re-compress
-            # unless we filtered them. Since we removed filters, we use the original context.
+    if turn["mode"] == "rag":
+        final_answer, final_confidence = calibrate_answer(
+            raw, turn["context"], turn["answer_conf_score"]
+        )
+        turn["reply"] = strip_disallowed_prefixes(final_answer)
+        turn["confidence"] = final_confidence
+    else:
+        turn["reply"] = raw
 
-            answer_conf_score = aggregate_answer_confidence(chunks)
-            confidence = confidence_label(answer_conf_score)
 
-            messages = history + [{"role": "user", "content": translated_question}]
-            prompt = build_prompt(messages, context, company_id=company_id)
+async def finish_turn(user_id: str, conversation_id: str, turn: dict) -> dict:
+    """Log, translate and persist a completed turn, returning the API response."""
+    company_id = turn["company_id"]
+    question = turn["question"]
 
-            ce_used = any("ce_score" in c for c in chunks)
+    if not turn["persist"]:
+        # The chat route reserved one query up front; cached/empty turns are not metered
+        await release_query(company_id)
+        return {
+            "reply": turn["reply"],
+            "sources": turn["sources"],
+            "confidence": turn["confidence"],
+            "cached": turn["cached"]
+        }
 
-            # Always try LLM if we have context, unless confidence is extremely low
-            should_generate = context.strip() and answer_conf_score >= 0.4
-            
-            if should_generate:
-                try:
-                    raw = generate_gemini_response(prompt)
-                    final_answer, final_confidence = calibrate_answer(
-                        raw.strip(), context, answer_conf_score
-                    )
-                    final_answer = strip_disallowed_prefixes(final_answer)
-                except Exception as e:
-                    # If LLM fails (e.g. Rate Limit 429), fall back gracefully
-                    if "429" in str(e) or "ResourceExhausted" in str(e):
-                        final_answer = "⚠️ System is busy (Rate Limit). Please try again in a minute."
-                        final_confidence = "low" 
-                        # Do NOT dump raw context here, it confuses users.
-                    else:
-                        logger.error(f"LLM Generation failed: {e}")
-                        final_answer = "I found some info but couldn't process it. Please check the sources."
-                        final_confidence = "low"
-
-            else:
-                final_confidence = confidence
-                if confidence == "low":
-                    final_answer = REFUSAL_MESSAGE
-                    sources = []
-                else:
-                     # Fallback for when context exists but score < 0.4 (very rare with top_k=8)
-                     final_answer = "I found relevant documents but they might not fully answer your question. Please verify the sources below."
-
-            if final_confidence != "high":
-                await log_negative_retrieval(
-                    question=translated_question,
-                    confidence=final_confidence,
-                    answer_conf_score=answer_conf_score,
-                    ce_used=ce_used,
-                    top_ce_score=chunks[0].get("ce_score") if chunks else None,
-                    sources=sources,
-                )
-
-            # Automatic caching is DISABLED.
-            # Caching is now triggered via the /feedback endpoint upon positive user feedback.
-            # if final_confidence == "high":
-            #     await store_response(...)
+    if turn["mode"] == "rag" and turn["confidence"] != "high":
+        chunks = turn["chunks"]
+        await log_negative_retrieval(
+            question=turn["translated_question"],
+            confidence=turn["confidence"],
+            answer_conf_score=turn["answer_conf_score"],
+            ce_used=turn["ce_used"],
+            top_ce_score=chunks[0].get("ce_score") if chunks else None,
+            sources=turn["sources"],
+        )
 
-    except Exception:
-        logger.exception("Chat processing failed")
-        final_answer = "I'm temporarily unable to access internal knowledge."
-        final_confidence = "low"
-        sources = []
+    # Automatic caching is DISABLED.
+    # Caching is now triggered via the /feedback endpoint upon positive user feedback.
+    # if final_confidence == "high":
+    #     await store_response(translated_question, final_answer, sources, final_confidence, company_id=company_id)
 
     # 🌍 Lingo output translation
-    final_answer = await translate(final_answer, original_language)
+    final_answer = await translate(turn["reply"], turn["original_language"])
 
     answer = {
         "reply": final_answer,
-        "sources": sources,
-        "confidence": final_confidence,
-        "cached": cached
+        "sources": turn["sources"],
+        "confidence": turn["confidence"],
+        "cached": turn["cached"]
     }
 
     await db.conversations.update_one(
@@ -616,34 +663,137 @@ async def process_chat(user_id: str, conversation_id: str, question: str, compan
         upsert=True
     )
 
-    # ---------------------------------------------------------
-    # 📊 INCREMENT USAGE STATS (Monthly Queries)
-    # ---------------------------------------------------------
-    if company_id:
-        await db.admins.update_one(
-            {"company_id": company_id},
-            {
-                "$inc": {"usage.queries_this_month": 1},
-                "$set": {"usage.last_query_date": datetime.utcnow()}
-            }
-        )
-        print(f"📈 USAGE: Incremented query count for company '{company_id}'")
+    if turn["mode"] == "error" or turn.get("failed"):
+        # No answer was produced: refund the query reserved by the chat route
+        await release_query(company_id)
 
     return answer
 
 
+# Identical concurrent questions share one computation. The prompt includes the
+# conversation history, so only callers whose recent history is identical (e.g.
+# two fresh conversations) may share an answer.
+chat_flight = SingleFlight("chat")
+
+
+def history_fingerprint(history: list[dict]) -> str:
+    digest = hashlib.sha256()
+    for message in history:
+        digest.update(f"{message.get('role')}\x00{message.get('content')}\x01".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def flight_key(question: str, company_id: str = None, original_language: str = "en", history: list[dict] = ()) -> tuple:
+    return ((company_id or "").lower(), normalize_query(question), original_language, history_fingerprint(history))
+
+
+async def prefetch_turn(question: str, company_id: str = None):
+    """
+    The history-independent start of a turn: resolve the tenant's tier and
+    embed the retrieval query, so the turn's retrieval finds both cached.
+    """
+    tier = await resolve_tenant_tier(company_id)
+    if question.strip() and not is_conversational_query(question) and detect_intent(question) not in DIRECT_INTENTS:
+        await embed_text(normalize_query(question), dimensions=tier.dimensions)
+
+
+async def load_history(conversation_id: str, question: str = None, company_id: str = None) -> list[dict]:
+    """
+    Recent messages of a conversation (empty if unavailable within the request deadline).
+
+    The coalescing key needs the history before the turn can start; with
+    ``question`` set, ``prefetch_turn`` runs concurrently so the history
+    read does not add a round-trip in front of the rest of the turn.
+    """
+    deadline = request_deadline()
+    stages = [await_stage(get_recent_messages(conversation_id), deadline, [], name="history")]
+    if question is not None:
+        stages.append(await_stage(prefetch_turn(question, company_id), deadline, name="prefetch"))
+    history, *_ = await asyncio.gather(*stages)
+    return history
+
+
+async def answer_turn(conversation_id: str, question: str, company_id: str = None, original_language: str = "en",
+                      history: list[dict] = None) -> dict:
+    """Prepare a turn and generate its answer (everything except persistence)."""
+    turn = await prepare_turn(conversation_id, question, company_id=company_id, original_language=original_language,
+                              history=history)
+
+    if turn["prompt"] is not None:
+        try:
+            raw = await generate_gemini_response(turn["prompt"])
+            complete_turn(turn, raw)
+        except Exception as e:
+            complete_turn(turn, error=e)
+
+    return turn
+
+
+async def process_chat(user_id: str, conversation_id: str, question: str, company_id: str = None, original_language: str = "en"):
+    history = await load_history(conversation_id, question, company_id)
+    turn = await chat_flight.do(
+        flight_key(question, company_id, original_language, history),
+        lambda: answer_turn(conversation_id, question, company_id=company_id, original_language=original_language,
+                            history=history)
+    )
+
+    # Coalesced callers share the answer but each persists its own conversation and usage
+    return await finish_turn(user_id, conversation_id, dict(turn))
+
+
+async def stream_chat(user_id: str, conversation_id: str, question: str, company_id: str = None, original_language: str = "en"):
+    """
+    Streaming variant of ``process_chat``.
+
+    Yields ``(event, data)`` tuples: one ``meta`` event with sources and
+    confidence as soon as retrieval is done, a ``token`` event per text delta
+    received from Gemini, and a final ``done`` event carrying the complete
+    (calibrated, translated) response in the same shape as ``process_chat``.
+
+    If an identical question with the same conversation history is already
+    being answered by ``process_chat`` the stream joins it and emits the
+    finished answer as a single token.
+    """
+    history = await load_history(conversation_id, question, company_id)
+    inflight = chat_flight.get(flight_key(question, company_id, original_language, history))
+    if inflight is not None:
+        turn = dict(await chat_flight.join(inflight))
+        yield "meta", {
+            "sources": turn["sources"],
+            "confidence": turn["confidence"],
+            "cached": turn["cached"]
+        }
+        yield "token", {"text": turn["reply"]}
+        yield "done", await finish_turn(user_id, conversation_id, turn)
+        return
+
+    turn = await prepare_turn(conversation_id, question, company_id=company_id, original_language=original_language,
+                              history=history)
+
+    yield "meta", {
+        "sources": turn["sources"],
+        "confidence": turn["confidence"],
+        "cached": turn["cached"]
+    }
+
+    if turn["prompt"] is not None:
+        parts = []
+        try:
+            async for delta in stream_gemini_response(turn["prompt"]):
+                parts.append(delta)
+                yield "token", {"text": delta}
+            complete_turn(turn, "".join(parts))
+        except Exception as e:
+            complete_turn(turn, error=e)
+    else:
+        yield "token", {"text": turn["reply"]}
+
+    yield "done", await finish_turn(user_id, conversation_id, turn)
+
+
 # =====================================================
 # Helpers
 # =====================================================
-def normalize(scores):
-    if not scores:
-        return []
-    m = max(scores)
-    if m == 0:
-        return [0 for _ in scores]
-    return [s / m for s in scores]
-
-
 def aggregate_answer_confidence(chunks):
     semantic = [c for c in chunks if c["type"] == "semantic"]
     if not semantic:
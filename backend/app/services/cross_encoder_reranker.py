@@ -1,33 +1,53 @@
 # app/services/cross_encoder_reranker.py
 
+import os
 import time
 import logging
 from sentence_transformers import CrossEncoder
 
+from app.services.batching import MicroBatcher
+
 logger = logging.getLogger("corpwise.ce")
 
+# Cross-request batching: pairs from concurrent requests share one predict() call
+CE_MAX_BATCH_SIZE = int(os.getenv("CE_MAX_BATCH_SIZE", "64"))
+CE_MAX_WAIT_MS = float(os.getenv("CE_MAX_WAIT_MS", "5"))
+
 _ce_model = None
 
+
 def get_ce_model():
     global _ce_model
     if _ce_model is None:
+        logger.info("[CE] Loading cross-encoder model")
         _ce_model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
     return _ce_model
 
 
-def cross_encoder_rerank(query: str, chunks: list, top_k: int = 3):
+def _predict_batch(pairs: list) -> list:
+    # Runs on the batcher's worker thread (model load included), never on the event loop
+    return get_ce_model().predict(pairs, batch_size=CE_MAX_BATCH_SIZE)
+
+
+ce_batcher = MicroBatcher(
+    "cross-encoder",
+    _predict_batch,
+    max_batch_size=CE_MAX_BATCH_SIZE,
+    max_wait_ms=CE_MAX_WAIT_MS
+)
+
+
+async def cross_encoder_rerank(query: str, chunks: list, top_k: int = 3):
     """
     chunks: [{ text, source, type, score, norm_score }]
     """
     if not chunks:
         return []
 
-    model = get_ce_model()
-
     pairs = [(query, c["text"]) for c in chunks]
 
     start = time.time()
-    scores = model.predict(pairs)
+    scores = await ce_batcher.submit(pairs)
     latency = round((time.time() - start) * 1000, 2)
 
     for chunk, ce_score in zip(chunks, scores):
@@ -46,10 +66,3 @@ def cross_encoder_rerank(query: str, chunks: list, top_k: int = 3):
     )
 
     return reranked[:top_k]
-
-def get_ce_model():
-    global _ce_model
-    if _ce_model is None:
-        logger.info("[CE] Loading cross-encoder model")
-        _ce_model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-    return _ce_model
@@ -4,20 +4,36 @@ Handles chunking, embedding, and indexing of uploaded documents.
 """
 
 from datetime import datetime
+import hashlib
 import uuid
 import re
 from pathlib import Path
-from typing import List, Dict
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
 import asyncio
+import os
+import time
 
-from app.services.embeddings import embed_text
-from app.db.pinecone_client import get_index
+from pymongo import UpdateOne
+
+from app.services.embeddings import embed_texts
+from app.services.pdf_extractor import PdfPages
+from app.services.vector_store import get_vector_store
+from app.services.upsert_pipeline import upsert_vectors
+from app.services.keyword_retriever import index_chunks, remove_chunks, remove_document
+from app.services.sparse_encoder import HYBRID_INGEST, encode_document as encode_sparse_document
 from app.db.mongodb import db
 
 # Configuration
 CHUNK_SIZE = 400
 OVERLAP = 50
 
+# Chunks read, embedded and upserted per step while streaming a document
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+# Embedded batches that may be upserting while the next one is embedded
+INGEST_PIPELINE_DEPTH = int(os.getenv("INGEST_PIPELINE_DEPTH", "2"))
+
 
 def sanitize_for_pinecone_id(text: str) -> str:
     """
@@ -56,6 +72,70 @@ def split_markdown_by_section(text: str) -> List[tuple]:
     return [(s, b) for s, b in sections if b]
 
 
+class StreamingChunker:
+    """
+    Incremental form of `chunk_text`: feed text pieces as they are read,
+    get back the chunks that are already final. Only the unfinished tail
+    (under one chunk window) is buffered, and the output is identical to
+    chunking the concatenated text in one go.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP):
+        # Convert word-count chunk_size to rough character count (assuming ~6 chars/word)
+        # This keeps it properly sized for embedding models
+        self.char_chunk_size = chunk_size * 6
+        self.char_overlap = overlap * 6
+        self.buffer = ""
+        self.start = 0
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        # A window is final once text exists past its end: the break point
+        # search only looks inside the window
+        chunks = self._drain(final=False)
+        if self.start:
+            self.buffer = self.buffer[self.start:]
+            self.start = 0
+        return chunks
+
+    def close(self) -> List[str]:
+        chunks = self._drain(final=True)
+        self.buffer, self.start = "", 0
+        return chunks
+
+    def _drain(self, final: bool) -> List[str]:
+        chunks = []
+        text = self.buffer
+        text_len = len(text)
+
+        while self.start < text_len and (final or text_len - self.start > self.char_chunk_size):
+            start = self.start
+            end = start + self.char_chunk_size
+            
+            # If we are not at the end of text, try to find a nice break point (newline or space)
+            if end < text_len:
+                # Look for last newline in the window
+                last_newline = text.rfind('\n', start, end)
+                if last_newline != -1 and last_newline > start + (self.char_chunk_size // 2):
+                    end = last_newline + 1
+                else:
+                    # Fallback to last space
+                    last_space = text.rfind(' ', start, end)
+                    if last_space != -1:
+                        end = last_space + 1
+            
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+
+            self.start = end - self.char_overlap
+            # Ensure progress
+            if self.start >= end:
+                self.start = end
+                
+        return chunks
+
+
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP) -> List[str]:
     """
     Split text into overlapping chunks while PRESERVING newlines.
@@ -64,41 +144,133 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP)
     if not text:
         return []
 
-    # Simple character-based sliding window that tries to respect line breaks
-    chunks = []
-    start = 0
-    text_len = len(text)
+    chunker = StreamingChunker(chunk_size, overlap)
+    return chunker.feed(text) + chunker.close()
 
-    # Convert word-count chunk_size to rough character count (assuming ~6 chars/word)
-    # This keeps it properly sized for embedding models
-    CHAR_CHUNK_SIZE = chunk_size * 6 
-    CHAR_OVERLAP = overlap * 6
 
-    while start < text_len:
-        end = start + CHAR_CHUNK_SIZE
-        
-        # If we are not at the end of text, try to find a nice break point (newline or space)
-        if end < text_len:
-            # Look for last newline in the window
-            last_newline = text.rfind('\n', start, end)
-            if last_newline != -1 and last_newline > start + (CHAR_CHUNK_SIZE // 2):
-                end = last_newline + 1
+# =====================================================
+# Streaming Document Readers
+# =====================================================
+# Each reader yields (section_title, chunk_index, chunk) without holding
+# the whole file in memory.
+
+class DocumentParseError(Exception):
+    """The upload could not be read (e.g. a corrupt PDF)."""
+
+
+def iter_markdown_chunks(file_path: str) -> Iterator[Tuple[str, int, str]]:
+    """Chunks of each markdown section, streamed line by line (same output as
+    split_markdown_by_section + chunk_text)."""
+    section = "overview"
+    chunker = StreamingChunker()
+    index = 0
+    started = False      # section body has non-blank text (leading blanks are stripped)
+    blank_lines = 0      # held back: trailing blanks are stripped too
+
+    def emit(chunks):
+        nonlocal index
+        for chunk in chunks:
+            yield section, index, chunk
+            index += 1
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#"):
+                yield from emit(chunker.close())
+                section = line.lstrip("#").strip().lower()
+                index, started, blank_lines = 0, False, 0
+            elif not line:
+                blank_lines += started
             else:
-                # Fallback to last space
-                last_space = text.rfind(' ', start, end)
-                if last_space != -1:
-                    end = last_space + 1
-        
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        start = end - CHAR_OVERLAP
-        # Ensure progress
-        if start >= end:
-            start = end
-            
-    return chunks
+                yield from emit(chunker.feed("\n" * (blank_lines + started) + line))
+                started, blank_lines = True, 0
+
+    yield from emit(chunker.close())
+
+
+def iter_text_chunks(file_path: str, block_size: int = 64 * 1024) -> Iterator[Tuple[str, int, str]]:
+    """Chunks of a plain text file, read in fixed-size blocks."""
+    chunker = StreamingChunker()
+    index = 0
+    with open(file_path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            chunks = chunker.feed(block) if block else chunker.close()
+            for chunk in chunks:
+                yield "General Content", index, chunk
+                index += 1
+            if not block:
+                return
+
+
+async def iter_pdf_chunks(pages: PdfPages) -> AsyncIterator[Tuple[str, int, str]]:
+    """Chunks of a PDF's text, with pages extracted in the PDF process pool."""
+    chunker = StreamingChunker()
+    index = 0
+    separator = ""
+    try:
+        async for page in pages:
+            for chunk in chunker.feed(separator + page.text):
+                yield "General Content", index, chunk
+                index += 1
+            separator = "\n"
+    except Exception as e:
+        raise DocumentParseError(f"PDF Error: {str(e)}")
+    for chunk in chunker.close():
+        yield "General Content", index, chunk
+        index += 1
+
+
+def iter_document_chunks(file_path: str, filename: str) -> Iterator[Tuple[str, int, str]]:
+    if filename.lower().endswith(".md"):
+        return iter_markdown_chunks(file_path)
+    # Treat other files (TXT) as one big 'content' section
+    return iter_text_chunks(file_path)
+
+
+def _take(chunks: Iterator, n: int) -> list:
+    return list(islice(chunks, n))
+
+
+async def iter_chunk_batches(
+    file_path: str,
+    filename: str,
+    size: int = INGEST_BATCH_CHUNKS,
+    pdf_pages: Optional[PdfPages] = None
+) -> AsyncIterator[list]:
+    """Lists of up to ``size`` (section_title, chunk_index, chunk) tuples."""
+    if pdf_pages is not None:
+        batch = []
+        async for item in iter_pdf_chunks(pdf_pages):
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    chunks = iter_document_chunks(file_path, filename)
+    # Reading and chunking is blocking file I/O: keep it off the event loop
+    while batch := await asyncio.to_thread(_take, chunks, size):
+        yield batch
+
+
+def chunk_hash(section_title: str, text: str) -> str:
+    """Content address of a chunk (what its embedding and payload depend on)."""
+    return hashlib.sha256(f"{section_title}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(doc_id: str, section_title: str, digest: str, occurrence: int = 0) -> str:
+    """
+    Deterministic vector ID: the same content of the same document always
+    gets the same ID, so retries overwrite instead of duplicating and
+    re-indexing can tell unchanged chunks from new ones.
+    """
+    # Sanitize section title for use in Pinecone ID (ASCII only)
+    chunk_id = f"{doc_id}__{sanitize_for_pinecone_id(section_title)}__{digest[:16]}"
+    return f"{chunk_id}_{occurrence}" if occurrence else chunk_id
 
 
 async def process_and_index_document(
@@ -107,11 +279,25 @@ async def process_and_index_document(
     doc_type: str,
     filename: str,
     company_id: str = None,  # Company/tenant ID for namespace
-    dimensions: int = 384     # Vector dimensions for embedding
+    dimensions: int = 384,    # Vector dimensions for embedding
+    on_progress: Callable[[dict], Awaitable] = None,  # Ingestion job progress reporting
+    max_pdf_pages: Optional[int] = None  # Tier page cap for PDFs (None/-1 = no cap)
 ) -> Dict:
     """
     Process a document file and index it to Pinecone.
     
+    The file is streamed: chunks are read, embedded, upserted and stored
+    INGEST_BATCH_CHUNKS at a time, so memory use does not grow with the
+    file size.
+    
+    Indexing is incremental. Chunk IDs are content-addressed, so when the
+    document already has chunks (a replaced file, or a job resumed after a
+    crash) only chunks with new IDs are embedded and upserted, and stored
+    chunks missing from the new content are deleted at the end. If
+    processing fails, the newly added chunks are removed and the previous
+    version stays indexed; chunks left by earlier interrupted runs are
+    removed by the caller with `purge_document`.
+    
     Args:
         file_path: Path to the document file
         doc_id: Unique document ID
@@ -119,134 +305,235 @@ async def process_and_index_document(
         filename: Original filename
         company_id: Optional company/tenant ID for namespace isolation
         dimensions: Vector dimensions (384, 768, or 1024) based on tier
+        on_progress: Optional async callback receiving {"stage", ...} updates
+        max_pdf_pages: Index at most this many PDF pages (extra pages are skipped)
         
     Returns:
         Dict with processing results
     """
-    # Read file content
-    content = ""
-    if filename.lower().endswith(".pdf"):
-        # PDF Parsing
-        try:
-            from pydantic import ValidationError
-            from pypdf import PdfReader
-            
-            reader = PdfReader(file_path)
-            text_parts = []
-            for page in reader.pages:
-                text_parts.append(page.extract_text() or "")
-            content = "\n".join(text_parts)
-            
-            # If PDF is just images (scanned), this might be empty.
-            if not content.strip():
-                return {"status": "failed", "message": "Empty or scanned PDF (OCR not supported yet)"}
-                
-        except Exception as e:
-            return {"status": "failed", "message": f"PDF Error: {str(e)}"}
-            
-    else:
-        # Markdown/Text Parsing
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-    
-    # Split into sections (works for markdown and plain text)
-    if filename.lower().endswith(".md"):
-        sections = split_markdown_by_section(content)
-    else:
-        # Treat other files (TXT, PDF) as one big 'content' section or crude splitting
-        # For simplicity, treat as one section named "General"
-        sections = [("General Content", content)]
-    
-    # Process each section
-    # Get index for specified dimensions
-    index = get_index(dimensions)
+    # Get vector store for specified dimensions
+    store = get_vector_store(dimensions)
     pinecone_ids = []
-    total_chunks = 0
+    added_ids = []
     
     # Target namespace: default to "" if None
     namespace = company_id if company_id else ""
     
-    print(f"📄 Processing document with {dimensions}-dim embeddings")
+    # Chunks already stored for this document: chunk_id -> position
+    existing: Dict[str, Optional[int]] = {}
+    async for chunk in db.chunks.find({"company_id": namespace, "doc_id": doc_id}, {"_id": 0, "chunk_id": 1, "chunk_index": 1}):
+        existing[chunk["chunk_id"]] = chunk.get("chunk_index")
+    seen = set()
+    moved: List[UpdateOne] = []  # Unchanged chunks at a new position
+    occurrences: Dict[str, int] = {}
+    storing: Deque[asyncio.Task] = deque()  # Batches being upserted/stored
+    upserts = {"vectors": 0, "batches": 0, "retries": 0, "started": None, "finished": None}
+    
+    hybrid = HYBRID_INGEST and store.supports_hybrid
+    print(f"📄 Processing document with {dimensions}-dim embeddings{' + sparse vectors' if hybrid else ''}"
+          f"{f' ({len(existing)} chunks already indexed)' if existing else ''}")
 
-    # Arrays for batching
-    pinecone_vectors = []
-    mongo_documents = []
+    pdf_pages = PdfPages(file_path, max_pdf_pages) if filename.lower().endswith(".pdf") else None
+    try:
+        async for batch in iter_chunk_batches(file_path, filename, pdf_pages=pdf_pages):
+            # Address every chunk; only unseen content needs embedding
+            new_chunks = []
+            for section_title, i, chunk_text_content in batch:
+                digest = chunk_hash(section_title, chunk_text_content)
+                occurrence = occurrences.get(digest, 0)
+                occurrences[digest] = occurrence + 1
+                chunk_id = make_chunk_id(doc_id, section_title, digest, occurrence)
+                pinecone_ids.append(chunk_id)
+                if chunk_id in existing:
+                    seen.add(chunk_id)
+                    if existing[chunk_id] != i:
+                        moved.append(UpdateOne(
+                            {"company_id": namespace, "doc_id": doc_id, "chunk_id": chunk_id},
+                            {"$set": {"chunk_index": i}}
+                        ))
+                else:
+                    new_chunks.append((chunk_id, section_title, i, chunk_text_content))
 
-    for section_title, section_body in sections:
-        chunks = chunk_text(section_body)
-        
-        # Sanitize section title for use in Pinecone ID (ASCII only)
-        safe_section_title = sanitize_for_pinecone_id(section_title)
-        
-        if not chunks:
-            continue
-            
-        # Batch embedding generation
-        embeddings = await asyncio.gather(
-            *[embed_text(chunk, dimensions=dimensions) for chunk in chunks]
-        )
-        
-        for i, (chunk_text_content, embedding) in enumerate(zip(chunks, embeddings)):
-            # Create unique ID with sanitized section name
-            chunk_id = f"{doc_id}__{safe_section_title}__{i}"
-            pinecone_ids.append(chunk_id)
-            
-            # Prepare metadata (keep original section_title for metadata)
-            metadata = {
-                "text": chunk_text_content,
-                "source": f"{doc_type}/{filename}",
-                "section": section_title,  # Original with emojis for display
-                "doc_id": doc_id,
-                "doc_type": doc_type,
-                "chunk_index": i,
-                "company_id": namespace, # Optional logging
-                "dimensions": dimensions  # Track which tier/model was used
-            }
-            
-            pinecone_vectors.append((chunk_id, embedding, metadata))
-            
-            mongo_documents.append({
-                "doc_id": doc_id,
-                "chunk_id": chunk_id,
-                "text": chunk_text_content,
-                "source": metadata["source"],
-                "section": section_title,  # Original with emojis
-                "doc_type": doc_type,
-                "company_id": namespace, # Store in Mongo too
-                "dimensions": dimensions,  # Track tier
-                "created_at": datetime.utcnow()
-            })
-            
-            total_chunks += 1
-            
-    # Batch inserts
-    if pinecone_vectors:
-        batch_size = 500
-        for i in range(0, len(pinecone_vectors), batch_size):
-            batch = pinecone_vectors[i:i + batch_size]
-            await asyncio.to_thread(index.upsert, vectors=batch, namespace=namespace)
-
-    if mongo_documents:
-        await db.chunks.insert_many(mongo_documents)
-    
-    return {
-        "chunk_count": total_chunks,
+            if new_chunks:
+                embeddings = await embed_texts([text for _, _, _, text in new_chunks], dimensions=dimensions)
+
+                # Arrays for batching
+                pinecone_vectors = []
+                mongo_documents = []
+
+                for (chunk_id, section_title, i, chunk_text_content), embedding in zip(new_chunks, embeddings):
+                    # Prepare metadata (keep original section_title for metadata).
+                    # No chunk_index: unchanged chunks keep their vectors across
+                    # revisions, so positions are kept current in the chunk store only
+                    metadata = {
+                        "text": chunk_text_content,
+                        "source": f"{doc_type}/{filename}",
+                        "section": section_title,  # Original with emojis for display
+                        "doc_id": doc_id,
+                        "doc_type": doc_type,
+                        "company_id": namespace, # Optional logging
+                        "dimensions": dimensions  # Track which tier/model was used
+                    }
+                    
+                    if hybrid:
+                        # Sparse lexical weights next to the dense embedding (hybrid search)
+                        pinecone_vectors.append((chunk_id, embedding, metadata, encode_sparse_document(chunk_text_content)))
+                    else:
+                        pinecone_vectors.append((chunk_id, embedding, metadata))
+                    
+                    mongo_documents.append({
+                        "doc_id": doc_id,
+                        "chunk_id": chunk_id,
+                        "chunk_index": i,
+                        "text": chunk_text_content,
+                        "source": metadata["source"],
+                        "section": section_title,  # Original with emojis
+                        "doc_type": doc_type,
+                        "company_id": namespace, # Store in Mongo too
+                        "dimensions": dimensions,  # Track tier
+                        "created_at": datetime.utcnow()
+                    })
+                    
+                added_ids.extend(chunk_id for chunk_id, _, _, _ in new_chunks)
+                seen.update(added_ids[-len(new_chunks):])
+
+                # Store this batch while the next one is read and embedded
+                storing.append(asyncio.create_task(
+                    _store_batch(store, pinecone_vectors, mongo_documents, namespace, upserts)
+                ))
+                if len(storing) >= INGEST_PIPELINE_DEPTH:
+                    await storing.popleft()
+
+            if on_progress:
+                progress = {"stage": "indexing", "chunks": len(pinecone_ids), "embedded": len(added_ids)}
+                if pdf_pages is not None:
+                    progress.update(pages=len(pdf_pages.page_ms), page_count=pdf_pages.page_count)
+                await on_progress(progress)
+
+        while storing:
+            await storing.popleft()
+
+        # If PDF is just images (scanned), there is no text at all.
+        if pdf_pages is not None and not pinecone_ids:
+            raise DocumentParseError("Empty or scanned PDF (OCR not supported yet)")
+
+    except (Exception, asyncio.CancelledError) as e:
+        for task in storing:
+            task.cancel()
+        await asyncio.gather(*storing, return_exceptions=True)
+        # Roll back to the previous version: drop only what this run added
+        await _discard_chunks(doc_id, added_ids, namespace, dimensions)
+        if isinstance(e, DocumentParseError):
+            return {"status": "failed", "message": str(e)}
+        raise
+
+    # Content that is no longer in the document
+    removed_ids = list(existing.keys() - seen)
+    await _discard_chunks(doc_id, removed_ids, namespace, dimensions)
+    # Positions of unchanged chunks only move once the new revision is in
+    if moved:
+        await db.chunks.bulk_write(moved, ordered=False)
+
+    result = {
+        "chunk_count": len(pinecone_ids),
         "pinecone_ids": pinecone_ids,
-        "status": "indexed"
+        "status": "indexed",
+        "added": len(added_ids),
+        "removed": len(removed_ids),
+        "unchanged": len(pinecone_ids) - len(added_ids)
     }
+    print(f"🧩 Indexed {doc_id}: {result['added']} new, {result['unchanged']} unchanged, {result['removed']} removed chunks")
+
+    if upserts["vectors"]:
+        elapsed = upserts["finished"] - upserts["started"]
+        result["upsert"] = {
+            "vectors": upserts["vectors"],
+            "batches": upserts["batches"],
+            "retries": upserts["retries"],
+            "seconds": round(elapsed, 3),
+            "vectors_per_s": round(upserts["vectors"] / elapsed, 1) if elapsed > 0 else None
+        }
+        print(f"📤 Upserted {upserts['vectors']} vectors in {upserts['batches']} batches "
+              f"({result['upsert']['vectors_per_s']} vectors/s, {upserts['retries']} retries)")
+
+    if pdf_pages is not None:
+        result["pdf"] = pdf_pages.summary()
+        slowest = result["pdf"]["slowest_page"]
+        print(f"📑 PDF: {result['pdf']['pages_extracted']}/{pdf_pages.page_count} pages in {result['pdf']['extract_ms']:.0f} ms "
+              f"(slowest: page {slowest['page']}, {slowest['ms']:.0f} ms){' [truncated by tier page cap]' if pdf_pages.truncated else ''}")
+
+    return result
+
+
+async def _store_batch(store, vectors: list, mongo_documents: List[dict], namespace: str, totals: dict):
+    """Upsert a batch's vectors, then record its chunks (a stored chunk always has its vector)."""
+    started = time.perf_counter()
+    report = await upsert_vectors(store, vectors, namespace=namespace)
+    await db.chunks.insert_many(mongo_documents)
+    index_chunks(namespace, mongo_documents)
+
+    totals["vectors"] += report["vectors"]
+    totals["batches"] += report["batches"]
+    totals["retries"] += report["retries"]
+    totals["started"] = min(totals["started"] or started, started)
+    totals["finished"] = time.perf_counter()
+
+
+async def _discard_chunks(doc_id: str, chunk_ids: List[str], namespace: str, dimensions: int):
+    """Remove chunks of a document from the vector store, the chunk store and BM25."""
+    if not chunk_ids:
+        return
+    await delete_document_from_index(chunk_ids, company_id=namespace, dimensions=dimensions)
+    for i in range(0, len(chunk_ids), 1000):
+        await db.chunks.delete_many({"company_id": namespace, "doc_id": doc_id, "chunk_id": {"$in": chunk_ids[i:i + 1000]}})
+    remove_chunks(namespace, doc_id, chunk_ids)
+
+
+async def purge_document(
+    doc_id: str,
+    company_id: str = None,
+    dimensions: int = 384,
+    keep: List[str] = None,
+    vector_ids: List[str] = None
+) -> int:
+    """
+    Remove every stored chunk of a document except ``keep``.
+
+    Chunks are looked up by (company_id, doc_id) rather than taken from the
+    document record, so leftovers of interrupted or failed runs, which the
+    record never listed, go too. ``vector_ids`` adds ids known only to the
+    vector store (records indexed before chunks were stored). Returns the
+    number of chunks removed.
+    """
+    namespace = company_id if company_id else ""
+    chunk_ids = set(vector_ids or [])
+    async for chunk in db.chunks.find({"company_id": namespace, "doc_id": doc_id}, {"_id": 0, "chunk_id": 1}):
+        chunk_ids.add(chunk["chunk_id"])
+
+    if keep:
+        stale = list(chunk_ids - set(keep))
+        await _discard_chunks(doc_id, stale, namespace, dimensions)
+        return len(stale)
+
+    await delete_document_from_index(list(chunk_ids), company_id=namespace, dimensions=dimensions)
+    await db.chunks.delete_many({"company_id": namespace, "doc_id": doc_id})
+    remove_document(namespace, doc_id)
+    return len(chunk_ids)
 
 
 async def delete_document_from_index(pinecone_ids: List[str], company_id: str = None, dimensions: int = 384):
-    """Remove document chunks from Pinecone."""
+    """Remove document chunks from the vector store."""
     if not pinecone_ids:
         return
     
     namespace = company_id if company_id else ""
     
-    # Get the correct index for the document's dimensions
-    index = get_index(dimensions)
+    # Get the correct store for the document's dimensions
+    store = get_vector_store(dimensions)
     try:
-        index.delete(ids=pinecone_ids, namespace=namespace)
+        # Pinecone deletes at most 1000 ids per request
+        for i in range(0, len(pinecone_ids), 1000):
+            await asyncio.to_thread(store.delete, pinecone_ids[i:i + 1000], namespace=namespace)
         print(f"🗑️ Deleted {len(pinecone_ids)} vectors from {dimensions}-dim index (namespace: {namespace})")
     except Exception as e:
-        print(f"⚠️ Failed to delete from Pinecone ({dimensions}-dim): {e}")
+        print(f"⚠️ Failed to delete from vector store ({dimensions}-dim): {e}")
@@ -1,11 +1,19 @@
 from sentence_transformers import SentenceTransformer
+from collections import OrderedDict
 from datetime import datetime
+from functools import partial
+import asyncio
+import os
 import time
 from typing import Dict
-import asyncio
+
+import numpy as np
+from bson import Binary
+from pymongo.errors import BulkWriteError
 
 from app.db.mongodb import db
 from app.services.hash import sha256_hash
+from app.services.batching import MicroBatcher
 
 # ============================
 # Multi-Model Support (lazy loaded)
@@ -56,15 +64,185 @@ def get_model(dimensions: int = 384) -> SentenceTransformer:
     
     return _models[dimensions]
 
+# ============================
+# Cross-request batching (one queue per dimension)
+# ============================
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+_batchers: Dict[int, MicroBatcher] = {}
+
+
+def _encode_batch(dimensions: int, texts: list[str]) -> list[list[float]]:
+    # Runs on the batcher's worker thread (model load included), never on the event loop
+    model = get_model(dimensions)
+    encoded = model.encode(
+        texts,
+        batch_size=EMBED_MAX_BATCH_SIZE,
+        normalize_embeddings=True
+    )
+    return encoded.tolist()
+
+
+def get_batcher(dimensions: int = 384) -> MicroBatcher:
+    """Batching queue for the given dimension; concurrent embed_text callers share one encode()."""
+    if dimensions not in MODEL_MAP:
+        raise ValueError(f"Invalid dimensions: {dimensions}. Must be 384, 768, or 1024")
+
+    if dimensions not in _batchers:
+        _batchers[dimensions] = MicroBatcher(
+            f"embed-{dimensions}",
+            partial(_encode_batch, dimensions),
+            max_batch_size=EMBED_MAX_BATCH_SIZE,
+            max_wait_ms=EMBED_MAX_WAIT_MS
+        )
+    return _batchers[dimensions]
+
+
+def batching_metrics() -> Dict[int, dict]:
+    return {dim: b.metrics() for dim, b in _batchers.items()}
+
 # ============================
 # MongoDB collection
 # ============================
 embedding_cache = db.embedding_cache
 
 
+# ============================
+# Two-level embedding cache
+# ============================
+# L1: bounded in-process LRU keyed by (sha256, dimensions), vectors held as float32 arrays.
+# L2: Mongo `embedding_cache`, looked up in bulk with $in and storing vectors as
+#     compact binary (no chunk text), decoded lazily on read.
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+EMBED_CACHE_DTYPE = os.getenv("EMBED_CACHE_DTYPE", "float16")  # or "float32"
+
+_memory_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_cache_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+
+def _memory_get(key: tuple):
+    vec = _memory_cache.get(key)
+    if vec is not None:
+        _memory_cache.move_to_end(key)
+    return vec
+
+
+def _memory_put(key: tuple, vec: np.ndarray):
+    _memory_cache[key] = vec
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > EMBED_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _encode_vector(vec: np.ndarray) -> Binary:
+    return Binary(np.asarray(vec, dtype=EMBED_CACHE_DTYPE).tobytes())
+
+
+def _decode_cached(doc: dict) -> np.ndarray:
+    # Compact entries store raw bytes; legacy entries store a list of floats
+    if "vector" in doc:
+        return np.frombuffer(doc["vector"], dtype=doc.get("dtype", "float32")).astype(np.float32)
+    return np.asarray(doc["embedding"], dtype=np.float32)
+
+
+def cache_metrics() -> dict:
+    lookups = sum(_cache_stats.values())
+    hits = _cache_stats["memory_hits"] + _cache_stats["db_hits"]
+    return {
+        **_cache_stats,
+        "memory_entries": len(_memory_cache),
+        "memory_capacity": EMBED_CACHE_SIZE,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0,
+        "storage_dtype": EMBED_CACHE_DTYPE,
+    }
+
+
 # =====================================================
 # Async embedding with cache
 # =====================================================
+async def embed_texts(texts: list[str], dimensions: int = 384) -> list[list[float]]:
+    """
+    Embed many texts at once: memory cache, then one bulk Mongo lookup,
+    then a batched encode for whatever is still missing.
+    
+    Args:
+        texts: Texts to embed
+        dimensions: Vector dimensions (384, 768, or 1024)
+    
+    Returns:
+        One list of floats per input text (same order)
+    """
+    if not texts:
+        return []
+
+    hashes = [sha256_hash(t) for t in texts]
+    vectors: Dict[str, np.ndarray] = {}
+
+    # L1: in-process LRU
+    pending: Dict[str, str] = {}  # hash -> text
+    for h, t in zip(hashes, texts):
+        if h in vectors or h in pending:
+            continue
+        vec = _memory_get((h, dimensions))
+        if vec is not None:
+            vectors[h] = vec
+            _cache_stats["memory_hits"] += 1
+        else:
+            pending[h] = t
+
+    # L2: one $in round-trip for the whole batch
+    if pending:
+        # Create hash including dimensions to separate cache entries
+        keys = [f"{h}_{dimensions}" for h in pending]
+        cursor = embedding_cache.find(
+            {"cache_key": {"$in": keys}},
+            {"_id": 0, "text_hash": 1, "vector": 1, "dtype": 1, "embedding": 1}
+        )
+        async for doc in cursor:
+            h = doc.get("text_hash")
+            if h in pending:
+                vec = _decode_cached(doc)
+                vectors[h] = vec
+                _memory_put((h, dimensions), vec)
+                pending.pop(h)
+                _cache_stats["db_hits"] += 1
+
+    # Miss: generate embeddings (coalesced with concurrent callers of the same dimension)
+    if pending:
+        _cache_stats["misses"] += len(pending)
+        miss_hashes = list(pending.keys())
+        batcher = get_batcher(dimensions)
+        groups = await asyncio.gather(*[
+            batcher.submit([pending[h] for h in miss_hashes[i:i + EMBED_MAX_BATCH_SIZE]])
+            for i in range(0, len(miss_hashes), EMBED_MAX_BATCH_SIZE)
+        ])
+        encoded = [vec for group in groups for vec in group]
+
+        new_docs = []
+        for h, emb in zip(miss_hashes, encoded):
+            vec = np.asarray(emb, dtype=np.float32)
+            vectors[h] = vec
+            _memory_put((h, dimensions), vec)
+            new_docs.append({
+                "cache_key": f"{h}_{dimensions}",
+                "text_hash": h,
+                "vector": _encode_vector(vec),
+                "dtype": EMBED_CACHE_DTYPE,
+                "dimensions": dimensions,
+                "model": MODEL_MAP[dimensions],
+                "created_at": datetime.utcnow()
+            })
+
+        # Cache the embeddings (a concurrent request may have inserted some already)
+        try:
+            await embedding_cache.insert_many(new_docs, ordered=False)
+        except BulkWriteError:
+            pass
+
+    return [vectors[h].tolist() for h in hashes]
+
+
 async def embed_text(text: str, dimensions: int = 384) -> list[float]:
     """
     Generate embedding for text using specified dimension model.
@@ -76,31 +254,5 @@ async def embed_text(text: str, dimensions: int = 384) -> list[float]:
     Returns:
         List of floats representing the embedding
     """
-    # Create hash including dimensions to separate cache entries
-    cache_key = f"{sha256_hash(text)}_{dimensions}"
-    
-    cached = await embedding_cache.find_one({"cache_key": cache_key})
-    if cached:
-        return cached["embedding"]
-    
-    # Get appropriate model and generate embedding
-    model = get_model(dimensions)
-    encoded = await asyncio.to_thread(
-        model.encode,
-        text,
-        normalize_embeddings=True
-    )
-    embedding = encoded.tolist()
-    
-    # Cache the embedding
-    await embedding_cache.insert_one({
-        "cache_key": cache_key,
-        "text_hash": sha256_hash(text),
-        "text": text,
-        "embedding": embedding,
-        "dimensions": dimensions,
-        "model": MODEL_MAP[dimensions],
-        "created_at": datetime.utcnow()
-    })
-    
+    [embedding] = await embed_texts([text], dimensions=dimensions)
     return embedding
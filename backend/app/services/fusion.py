@@ -0,0 +1,157 @@
+"""
+Result Fusion
+Merges the ranked lists of the retrieval backends (semantic, keyword) into
+one candidate list, and picks a diverse subset of it for reranking.
+
+Scores are handled as NumPy arrays: each list is max-normalized (weighted
+fusion) or converted to reciprocal ranks (RRF), weighted per source, boosted
+for uploaded documents in the boosted sources (semantic by default, as in
+the original ranking) and summed per unique chunk. Selection is greedy
+maximal marginal relevance over the candidates' embedding similarity
+matrix, so a few hundred candidates cost around a millisecond.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+FUSION_METHOD = os.getenv("FUSION_METHOD", "weighted").lower()  # "weighted" or "rrf"
+RRF_K = int(os.getenv("FUSION_RRF_K", "60"))
+UPLOADED_DOC_BOOST = float(os.getenv("FUSION_UPLOADED_DOC_BOOST", "1.5"))
+# Sources whose scores get the uploaded-document boost, e.g. "semantic,keyword"
+BOOSTED_SOURCES = frozenset(s.strip() for s in os.getenv("FUSION_BOOSTED_SOURCES", "semantic").split(",") if s.strip())
+
+# Trade-off between relevance (1.0) and novelty (0.0) in MMR selection
+MMR_LAMBDA = float(os.getenv("FUSION_MMR_LAMBDA", "0.7"))
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    weights = {}
+    for part in raw.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            weights[name.strip()] = float(value)
+    return weights
+
+
+# Per-source weights, e.g. FUSION_WEIGHTS="semantic=0.6,keyword=0.4"
+SOURCE_WEIGHTS = _parse_weights(os.getenv("FUSION_WEIGHTS", "semantic=0.6,keyword=0.4"))
+
+
+def _chunk_key(chunk: dict) -> tuple:
+    return (chunk.get("source"), chunk.get("text"))
+
+
+def fuse(
+    result_lists: Dict[str, List[dict]],
+    method: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    uploaded_boost: float = UPLOADED_DOC_BOOST,
+    boosted_sources: Optional[frozenset] = None,
+) -> List[dict]:
+    """
+    Fuse per-source ranked chunk lists into one list sorted by fused score.
+
+    Each returned chunk carries ``norm_score`` (fused score on a 0-1 scale
+    before boosts). A chunk returned by several sources appears once, with
+    the scores of every source summed. Uploaded-document chunks (with a
+    ``doc_id``) have their score from each of ``boosted_sources``
+    multiplied by ``uploaded_boost``.
+    """
+    method = (method or FUSION_METHOD).lower()
+    weights = weights or SOURCE_WEIGHTS
+    boosted_sources = BOOSTED_SOURCES if boosted_sources is None else boosted_sources
+
+    keys: Dict[tuple, int] = {}
+    chunks: List[dict] = []
+    rows, contributions = [], []
+
+    for source, results in result_lists.items():
+        if not results:
+            continue
+        weight = weights.get(source, 1.0)
+
+        if method == "rrf":
+            # Lists arrive ranked best-first; normalize so rank 1 of every list scores `weight`
+            ranks = np.arange(1, len(results) + 1, dtype=np.float32)
+            scores = weight * (RRF_K + 1) / (RRF_K + ranks)
+        else:
+            raw = np.asarray([c.get("score", 0.0) for c in results], dtype=np.float32)
+            top = raw.max()
+            scores = weight * (raw / top if top > 0 else np.zeros_like(raw))
+
+        if uploaded_boost != 1.0 and source in boosted_sources:
+            uploaded = np.asarray([bool(c.get("doc_id")) for c in results])
+            scores = np.where(uploaded, scores * uploaded_boost, scores)
+
+        for chunk, score in zip(results, scores):
+            key = _chunk_key(chunk)
+            row = keys.get(key)
+            if row is None:
+                row = keys[key] = len(chunks)
+                chunks.append(chunk)
+            rows.append(row)
+            contributions.append(score)
+
+    if not chunks:
+        return []
+
+    fused = np.bincount(np.asarray(rows), weights=np.asarray(contributions), minlength=len(chunks))
+
+    order = np.argsort(-fused, kind="stable")
+    ranked = []
+    for i in order:
+        chunks[i]["norm_score"] = round(float(fused[i]), 4)
+        ranked.append(chunks[i])
+    return ranked
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, k: int, lambda_: float = MMR_LAMBDA) -> List[int]:
+    """
+    Greedy maximal marginal relevance.
+
+    ``relevance`` is (n,), ``similarity`` the (n, n) candidate-candidate
+    similarity. Returns the indices of up to ``k`` picks in selection order.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picks = []
+    for _ in range(min(k, n)):
+        mmr = lambda_ * relevance - (1 - lambda_) * max_sim
+        mmr[~available] = -np.inf
+        i = int(np.argmax(mmr))
+        picks.append(i)
+        available[i] = False
+        max_sim = np.maximum(max_sim, similarity[i])
+    return picks
+
+
+def diversify(candidates: List[dict], max_total: int = 6, lambda_: float = MMR_LAMBDA,
+              vectors: Optional[np.ndarray] = None) -> List[dict]:
+    """
+    Pick up to ``max_total`` relevant but mutually non-redundant candidates.
+
+    With ``vectors`` (one embedding row per candidate) redundancy is their
+    cosine similarity: one (n, n) matrix product per request. Without them,
+    candidates from the same source file count as fully redundant.
+    """
+    if len(candidates) <= 1:
+        return candidates[:max_total]
+
+    relevance = np.asarray([c.get("norm_score", 0.0) for c in candidates], dtype=np.float32)
+    if relevance.max() > 0:
+        relevance = relevance / relevance.max()
+
+    if vectors is not None:
+        unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similarity = np.clip(unit @ unit.T, 0.0, 1.0)
+    else:
+        _, source_ids = np.unique([str(c.get("source")) for c in candidates], return_inverse=True)
+        similarity = (source_ids[:, None] == source_ids[None, :]).astype(np.float32)
+
+    return [candidates[i] for i in mmr_select(relevance, similarity, max_total, lambda_)]
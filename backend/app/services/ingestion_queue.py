@@ -0,0 +1,276 @@
+"""
+Document Ingestion Queue
+Background parsing, embedding and indexing of uploaded documents.
+
+`upload_document` stores the file, creates the document record with status
+"pending" and calls `enqueue`; the request returns immediately. A bounded
+pool of INGEST_WORKERS asyncio workers processes jobs, taking tenants in
+round-robin order so one company's bulk upload cannot starve the others.
+
+The `documents` collection is the durable job store: a worker claims a job
+atomically (pending -> processing), reports progress through
+`DocumentModel.update_status`, refreshes a heartbeat every
+INGEST_HEARTBEAT_S while it runs, and finishes with "indexed" or "failed".
+On startup and every INGEST_STALE_S, pending jobs and jobs whose heartbeat
+is older than INGEST_STALE_S (a worker died mid-job) are queued again,
+except those this process is still running; indexing is incremental, so a resumed job only embeds what
+the interrupted run had not stored yet.
+
+Replacing a document (`revision` > 0) goes through the same queue. If the
+new version fails, the document keeps serving the previous one.
+"""
+
+import os
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Deque
+
+from app.models.document import DocumentModel
+from app.services.cache import invalidate_tenant_cache
+from app.services.document_processor import process_and_index_document, purge_document
+from app.services.metering import record_usage
+from app.services.tenant_profile import resolve_tenant_tier
+
+logger = logging.getLogger("corpwise.ingestion")
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_STALE_S = float(os.getenv("INGEST_STALE_S", "600"))
+# Running jobs refresh their heartbeat this often, independent of batch progress
+INGEST_HEARTBEAT_S = float(os.getenv("INGEST_HEARTBEAT_S", str(INGEST_STALE_S / 5)))
+
+
+class IngestionQueue:
+    """Per-tenant FIFO queues served round-robin by a fixed worker pool."""
+
+    def __init__(self):
+        self._tenants: "OrderedDict[str, Deque[str]]" = OrderedDict()  # company_id -> doc ids
+        self._queued: set = set()
+        self._active: set = set()  # Taken by a worker of this process, not yet finished
+        self._ready = asyncio.Event()
+
+    def put(self, doc_id: str, company_id: str = None) -> bool:
+        if doc_id in self._queued or doc_id in self._active:
+            return False
+        self._queued.add(doc_id)
+        self._tenants.setdefault(company_id or "", deque()).append(doc_id)
+        _stats["enqueued"] += 1
+        self._ready.set()
+        return True
+
+    async def get(self) -> str:
+        while not self._tenants:
+            self._ready.clear()
+            await self._ready.wait()
+        # Round-robin: take the head tenant's next job, then rotate it to the back
+        tenant, jobs = next(iter(self._tenants.items()))
+        doc_id = jobs.popleft()
+        del self._tenants[tenant]
+        if jobs:
+            self._tenants[tenant] = jobs
+        self._queued.discard(doc_id)
+        self._active.add(doc_id)
+        return doc_id
+
+    def done(self, doc_id: str):
+        self._active.discard(doc_id)
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+
+ingestion_queue = IngestionQueue()
+_stats = {"enqueued": 0, "indexed": 0, "failed": 0, "resumed": 0, "running": 0}
+
+
+def enqueue(doc_id: str, company_id: str = None):
+    """Queue a freshly created (status "pending") document for ingestion."""
+    ingestion_queue.put(doc_id, company_id)
+
+
+def ingestion_metrics() -> dict:
+    return {**_stats, "queued": len(ingestion_queue), "workers": INGEST_WORKERS}
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=INGEST_STALE_S)
+
+
+async def _heartbeat(doc_id: str):
+    while True:
+        await asyncio.sleep(INGEST_HEARTBEAT_S)
+        try:
+            await DocumentModel.heartbeat(doc_id)
+        except Exception as e:
+            logger.warning(f"[INGEST] heartbeat for {doc_id} failed: {e}")
+
+
+async def _ingest(doc_id: str):
+    doc = await DocumentModel.claim(doc_id, _stale_before())
+    if doc is None:
+        return  # Deleted, finished, or being processed by another worker
+
+    # Keep the claim fresh for as long as the job runs, however slow its batches are
+    heartbeat = asyncio.create_task(_heartbeat(doc_id))
+    try:
+        await _ingest_claimed(doc)
+    finally:
+        heartbeat.cancel()
+
+
+async def _restore_revision(doc: dict, error: str):
+    if doc.get("pinecone_ids"):
+        # Chunks of this or an earlier interrupted attempt at the new version
+        await purge_document(
+            doc["_id"],
+            company_id=doc.get("company_id"),
+            dimensions=doc.get("dimensions") or 384,
+            keep=doc["pinecone_ids"]
+        )
+    await DocumentModel.restore_previous_revision(
+        doc["_id"],
+        content_hash=doc.get("previous_content_hash"),
+        file_path=doc.get("previous_file_path"),
+        chunk_count=doc.get("chunk_count", 0),
+        error=error
+    )
+    # The rejected upload is no longer referenced
+    _remove_file(doc.get("file_path"), keep=doc.get("previous_file_path"))
+
+
+def _remove_file(path: str, keep: str = None):
+    if path and path != keep:
+        try:
+            Path(path).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"[INGEST] could not remove {path}: {e}")
+
+
+async def _ingest_claimed(doc: dict):
+    doc_id = doc["_id"]
+    company_id = doc.get("company_id")
+    # Replacing an indexed document: its previous version stays live until this job succeeds
+    is_revision = doc.get("revision", 0) > 0
+
+    async def report(progress: dict):
+        await DocumentModel.update_status(doc_id=doc_id, status="processing", progress=progress)
+
+    try:
+        tier = await resolve_tenant_tier(company_id)
+        result = await process_and_index_document(
+            file_path=doc["file_path"],
+            doc_id=doc_id,
+            doc_type=doc["doc_type"],
+            filename=doc["filename"],
+            company_id=company_id,
+            dimensions=doc.get("dimensions") or 384,
+            on_progress=report,
+            max_pdf_pages=tier.max_pdf_pages
+        )
+    except asyncio.CancelledError:
+        if is_revision:
+            # The new version's chunks were rolled back; serve the previous one again
+            await _restore_revision(doc, "Update interrupted by shutdown; upload the new version again")
+        else:
+            # Shutting down: hand the job back so the next start resumes it right away
+            await DocumentModel.update_status(doc_id=doc_id, status="pending")
+        raise
+    except Exception as e:
+        logger.exception(f"[INGEST] {doc_id} failed")
+        result = {"status": "failed", "message": str(e)}
+
+    if await DocumentModel.get_by_id(doc_id) is None:
+        # Deleted while being processed: the delete already released its slot,
+        # but chunks stored after it ran would be orphaned
+        await purge_document(doc_id, company_id=company_id, dimensions=doc.get("dimensions") or 384)
+        print(f"🗑️ INGEST DISCARDED: {doc['filename']} ({doc_id}) was deleted during processing")
+        return
+
+    if result["status"] != "indexed":
+        _stats["failed"] += 1
+        if is_revision:
+            # The previous version is still indexed (process_and_index_document rolled back)
+            await _restore_revision(doc, f"Update failed: {result.get('message')}")
+            print(f"❌ INGEST FAILED (previous version kept): {doc['filename']} ({doc_id}): {result.get('message')}")
+            return
+        # Nothing of it stays searchable, including chunks of earlier interrupted runs
+        await purge_document(doc_id, company_id=company_id, dimensions=doc.get("dimensions") or 384)
+        await DocumentModel.update_status(doc_id=doc_id, status="failed", error=result.get("message"))
+        # The upload reserved a document slot; give it back
+        record_usage(company_id, "documents_count", -1)
+        print(f"❌ INGEST FAILED: {doc['filename']} ({doc_id}): {result.get('message')}")
+        return
+
+    progress = {
+        "stage": "done",
+        "chunks": result["chunk_count"],
+        "added": result["added"],
+        "removed": result["removed"],
+        "unchanged": result["unchanged"]
+    }
+    if "upsert" in result:
+        progress["upsert"] = result["upsert"]  # Batches, retries, vectors/sec
+    if "pdf" in result:
+        progress["pdf"] = result["pdf"]  # Page counts and per-page extraction times
+    await DocumentModel.update_status(
+        doc_id=doc_id,
+        status="indexed",
+        chunk_count=result["chunk_count"],
+        pinecone_ids=result["pinecone_ids"],
+        progress=progress,
+        error=""
+    )
+    if is_revision:
+        # The new version is live; the file it replaced is no longer needed
+        _remove_file(doc.get("previous_file_path"), keep=doc.get("file_path"))
+
+    # Corpus changed: cached answers for this tenant may be stale
+    invalidate_tenant_cache(company_id)
+    _stats["indexed"] += 1
+    print(f"✅ INGESTED: {doc['filename']} ({doc_id}) → {result['chunk_count']} chunks")
+
+
+async def _worker(n: int):
+    while True:
+        doc_id = await ingestion_queue.get()
+        _stats["running"] += 1
+        try:
+            await _ingest(doc_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[INGEST] worker {n}: job {doc_id} errored: {e}")
+        finally:
+            ingestion_queue.done(doc_id)
+            _stats["running"] -= 1
+
+
+async def resume_pending_jobs() -> int:
+    """Re-queue jobs left unfinished by a previous run (or a crashed worker)."""
+    docs = await DocumentModel.find_resumable(_stale_before())
+    resumed = sum(ingestion_queue.put(doc["_id"], doc.get("company_id")) for doc in docs)
+    _stats["resumed"] += resumed
+    if resumed:
+        print(f"🔁 INGEST: Resuming {resumed} unfinished document jobs")
+    return resumed
+
+
+async def run_ingestion_workers():
+    """
+    Background task: run the worker pool until cancelled, re-queueing
+    unfinished jobs at startup and every INGEST_STALE_S after.
+    """
+    workers = [asyncio.create_task(_worker(n)) for n in range(INGEST_WORKERS)]
+    try:
+        while True:
+            try:
+                await resume_pending_jobs()
+            except Exception as e:
+                logger.warning(f"[INGEST] resume scan failed: {e}")
+            await asyncio.sleep(INGEST_STALE_S)
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -1,46 +1,294 @@
+"""
+Keyword Retrieval (BM25)
+Per-tenant in-process BM25 inverted index over the chunk store.
+
+Each tenant's index is built from `db.chunks` (what process_and_index_document
+writes) on first use, then kept current in place: uploads call
+`index_chunks` and deletes call `remove_document`. Other workers pick
+changes up when their copy is older than BM25_INDEX_TTL_S: the expired copy
+keeps serving while a replacement is built in a thread in the background,
+so no request waits on (or is blocked by) re-tokenizing the corpus.
+
+Postings are array-backed (`array('i')` chunk ids + `array('H')` term
+frequencies per term) and scored with NumPy, so a query is a handful of
+vectorized ops over the matching postings with no database round-trip.
+"""
+
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+from array import array
+from typing import Dict, List, Set
+
+import numpy as np
+
 from app.db.mongodb import db
+from app.services.single_flight import SingleFlight
 
-docs = db.internal_documents
+logger = logging.getLogger("corpwise.bm25")
 
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_INDEX_TTL_S = float(os.getenv("BM25_INDEX_TTL_S", "300"))
 
+# Rebuild a tenant's postings once this fraction of its chunks are deleted
+BM25_COMPACT_RATIO = 0.3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it
+its me my of on or our so that the their there this to was we what when where
+which who why will with you your
+""".split())
+
+_CHUNK_FIELDS = {"_id": 0, "chunk_id": 1, "text": 1, "source": 1, "section": 1, "doc_id": 1, "doc_type": 1}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class _TenantBM25:
+    """Inverted index of one tenant's chunks."""
+
+    def __init__(self):
+        self.chunks: List[dict] = []         # position -> chunk payload
+        self.lengths = array("i")            # position -> token count
+        self.alive = array("b")              # position -> 1 live / 0 deleted
+        self.terms: Dict[str, int] = {}      # term -> term id
+        self.postings_ids: List[array] = []  # term id -> chunk positions
+        self.postings_tf: List[array] = []   # term id -> term frequency in that chunk
+        self.df: List[int] = []              # term id -> live chunks containing it
+        self.live = 0
+        self.total_length = 0
+        self.loaded_at = time.monotonic()
+
+    def add(self, chunk: dict):
+        tokens = tokenize(chunk.get("text", ""))
+        pos = len(self.chunks)
+        self.chunks.append({k: chunk.get(k) for k in ("chunk_id", "text", "source", "section", "doc_id", "doc_type")})
+        self.lengths.append(len(tokens))
+        self.alive.append(1)
+        self.live += 1
+        self.total_length += len(tokens)
+
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for term, tf in counts.items():
+            tid = self.terms.get(term)
+            if tid is None:
+                tid = len(self.df)
+                self.terms[term] = tid
+                self.postings_ids.append(array("i"))
+                self.postings_tf.append(array("H"))
+                self.df.append(0)
+            self.postings_ids[tid].append(pos)
+            self.postings_tf[tid].append(min(tf, 65535))
+            self.df[tid] += 1
+
+    def remove(self, doc_id: str, chunk_ids: set = None) -> int:
+        """Mark a document's chunks (or only ``chunk_ids`` of it) deleted."""
+        removed = 0
+        for pos, chunk in enumerate(self.chunks):
+            if self.alive[pos] and chunk.get("doc_id") == doc_id and (chunk_ids is None or chunk.get("chunk_id") in chunk_ids):
+                self.alive[pos] = 0
+                self.live -= 1
+                self.total_length -= self.lengths[pos]
+                for term in set(tokenize(chunk.get("text", ""))):
+                    self.df[self.terms[term]] -= 1
+                removed += 1
+        return removed
+
+    def idf(self, term: str) -> float:
+        tid = self.terms.get(term)
+        df = max(self.df[tid], 0) if tid is not None else 0
+        return math.log(1 + (self.live - df + 0.5) / (df + 0.5))
+
+    def dead_ratio(self) -> float:
+        return 1 - self.live / len(self.chunks) if self.chunks else 0.0
+
+    def compacted(self) -> "_TenantBM25":
+        fresh = _TenantBM25()
+        for pos, chunk in enumerate(self.chunks):
+            if self.alive[pos]:
+                fresh.add(chunk)
+        fresh.loaded_at = self.loaded_at
+        return fresh
+
+    def search(self, query: str, limit: int) -> List[tuple]:
+        """Top ``limit`` (score, chunk) pairs for the query."""
+        if not self.live:
+            return []
+        term_ids = [self.terms[t] for t in set(tokenize(query)) if t in self.terms]
+        if not term_ids:
+            return []
+
+        n = len(self.chunks)
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        avgdl = self.total_length / self.live if self.live else 1.0
+        scores = np.zeros(n, dtype=np.float32)
+
+        for tid in term_ids:
+            df = self.df[tid]
+            if df <= 0:
+                continue
+            ids = np.frombuffer(self.postings_ids[tid], dtype=np.int32)
+            tf = np.frombuffer(self.postings_tf[tid], dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (self.live - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / avgdl)
+            scores[ids] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        scores[np.frombuffer(self.alive, dtype=np.int8) == 0] = 0
+        k = min(limit, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[p]), self.chunks[p]) for p in top]
+
+
+_indexes: Dict[str, _TenantBM25] = {}
+_loads = SingleFlight("bm25")
+_pending: Dict[str, List[tuple]] = {}  # tenant -> changes made while its index is being built
+_refreshes: Set[asyncio.Task] = set()
+
+
+def _tenant_key(company_id: str = None) -> str:
+    # Uploaded chunks are stored under the lowercase company id ("" = global)
+    return (company_id or "").lower()
+
+
+def _build(chunks: List[dict]) -> _TenantBM25:
+    index = _TenantBM25()
+    for chunk in chunks:
+        index.add(chunk)
+    return index
 
-async def keyword_search(query: str, company_id: str = None, limit: int = 5):
-    # Base filter criteria
-    filters = {"$text": {"$search": query}}
-    
-    # If company_id is provided, restrict search to that company
-    # If None, it defaults to global documents (company_id="")
-    # Note: We must match how we inserted it.
-    target_company = company_id if company_id else "" 
-    filters["company_id"] = target_company
-    
-    print(f"🔍 KEYWORD SEARCH | Company: '{company_id}' | Target: '{target_company}' | Query: {query}")
-    print(f"🔍 MONGODB FILTER: {filters}")
 
+async def _load(tenant: str) -> _TenantBM25:
+    # Record index_chunks/remove_* calls made while the corpus is read and tokenized
+    changes = _pending.setdefault(tenant, [])
     try:
-        from pymongo.errors import OperationFailure
-        results = await docs.find(
-            filters,
-            {"score": {"$meta": "textScore"}, "text": 1, "source": 1}
-        ).sort(
-            [("score", {"$meta": "textScore"})]
-        ).limit(limit).to_list(length=limit)
-    except OperationFailure as e:
-        print(f"⚠️ MONGODB KEYWORD SEARCH ERROR: {e}. Skipping keyword search.")
-        return []
+        chunks = [c async for c in db.chunks.find({"company_id": tenant}, _CHUNK_FIELDS) if c.get("text")]
+        # Tokenizing a whole corpus is CPU-bound: keep it off the event loop
+        index = await asyncio.to_thread(_build, chunks)
+
+        # No await from here on: replay and swap happen atomically for the loop
+        known = {c["chunk_id"] for c in index.chunks} if any(op == "add" for op, *_ in changes) else set()
+        for op, *args in changes:
+            if op == "add":
+                _add(index, [c for c in args[0] if c.get("chunk_id") not in known])
+            else:
+                index = _remove(index, *args)
+    finally:
+        _pending.pop(tenant, None)
+
+    _indexes[tenant] = index
+    print(f"📚 BM25 index built for '{tenant}': {index.live} chunks, {len(index.terms)} terms")
+    return index
+
+
+async def _refresh(tenant: str):
+    try:
+        await _loads.do(tenant, lambda: _load(tenant))
+    except Exception as e:
+        logger.warning(f"[BM25] refresh for '{tenant}' failed, serving the previous index: {e}")
+
+
+async def _get_index(company_id: str = None) -> _TenantBM25:
+    tenant = _tenant_key(company_id)
+    index = _indexes.get(tenant)
+    if index is None:
+        return await _loads.do(tenant, lambda: _load(tenant))
+
+    # Rebuild periodically so uploads handled by other workers become visible;
+    # the current index keeps serving until the new one is ready
+    if time.monotonic() - index.loaded_at > BM25_INDEX_TTL_S and _loads.get(tenant) is None:
+        task = asyncio.create_task(_refresh(tenant))
+        _refreshes.add(task)
+        task.add_done_callback(_refreshes.discard)
+    return index
+
+
+def _add(index: _TenantBM25, chunks: List[dict]):
+    for chunk in chunks:
+        if chunk.get("text"):
+            index.add(chunk)
+
+
+def _remove(index: _TenantBM25, doc_id: str, chunk_ids: set = None) -> _TenantBM25:
+    if index.remove(doc_id, chunk_ids) and index.dead_ratio() > BM25_COMPACT_RATIO:
+        return index.compacted()
+    return index
+
+
+def index_chunks(company_id: str, chunks: List[dict]):
+    """Add freshly stored chunks to the tenant's index (if this worker has it loaded)."""
+    tenant = _tenant_key(company_id)
+    if tenant in _pending:
+        _pending[tenant].append(("add", chunks))
+    index = _indexes.get(tenant)
+    if index is not None:
+        _add(index, chunks)
+
+
+def remove_document(company_id: str, doc_id: str):
+    """Drop a deleted document's chunks from the tenant's index."""
+    remove_chunks(company_id, doc_id, None)
+
+
+def remove_chunks(company_id: str, doc_id: str, chunk_ids: List[str] = None):
+    """Drop a document's chunks (or only ``chunk_ids`` of it) from the tenant's index."""
+    tenant = _tenant_key(company_id)
+    chunk_ids = set(chunk_ids) if chunk_ids is not None else None
+    if tenant in _pending:
+        _pending[tenant].append(("remove", doc_id, chunk_ids))
+    index = _indexes.get(tenant)
+    if index is not None:
+        _indexes[tenant] = _remove(index, doc_id, chunk_ids)
+
+
+def drop_tenant_index(company_id: str):
+    _indexes.pop(_tenant_key(company_id), None)
+
+
+def bm25_metrics() -> dict:
+    return {
+        "tenants_indexed": len(_indexes),
+        "chunks_indexed": sum(i.live for i in _indexes.values()),
+        "terms": sum(len(i.terms) for i in _indexes.values()),
+    }
+
+
+async def term_idf(query: str, company_id: str = None) -> Dict[str, float]:
+    """BM25 IDF of each query term over the tenant's chunks (sparse query weights)."""
+    index = await _get_index(company_id)
+    return {term: index.idf(term) for term in set(tokenize(query))}
+
+
+async def keyword_search(query: str, company_id: str = None, limit: int = 5):
+    index = await _get_index(company_id)
+
+    start = time.perf_counter()
+    results = index.search(query, limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"🔍 KEYWORD SEARCH (BM25) | Company: '{company_id}' | Hits: {len(results)} | {elapsed_ms:.2f} ms | Query: {query}")
 
     chunks = []
 
-    for doc in results:
+    for score, doc in results:
         chunks.append({
             "text": doc["text"],
             "source": doc["source"],
             "section": doc.get("section"),
             "doc_id": doc.get("doc_id"),  # Extract doc_id for boost detection
             "doc_type": doc.get("doc_type"),  # Also extract doc_type
-            "score": doc["score"],
+            "score": score,
             "type": "keyword"
         })
 
     return chunks
-
@@ -1,7 +1,9 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 from google import genai
-from tenacity import retry, retry_if_exception, stop_after_attempt
+from google.genai import types
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 # Load environment variables
 load_dotenv()
@@ -11,10 +13,29 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
     raise RuntimeError("GEMINI_API_KEY is not set")
 
-client = genai.Client(api_key=API_KEY)
-
 MODEL_NAME = "models/gemini-2.5-flash-lite"
 
+# Per-call HTTP timeout and cap on in-flight completions per worker
+REQUEST_TIMEOUT_MS = int(os.getenv("GEMINI_TIMEOUT_MS", "60000"))
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+
+# One client for the whole process: its async transport keeps a pooled
+# HTTP connection that every request reuses.
+client = genai.Client(
+    api_key=API_KEY,
+    http_options=types.HttpOptions(timeout=REQUEST_TIMEOUT_MS)
+)
+
+_semaphore: asyncio.Semaphore | None = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
 
 def is_rate_limit_error(exception: Exception) -> bool:
     """
@@ -32,30 +53,62 @@ def is_rate_limit_error(exception: Exception) -> bool:
     return False
 
 
-from tenacity import retry, stop_after_attempt, wait_exponential
-
-# ... (imports)
-
-def generate_gemini_response(prompt: str) -> str:
+async def generate_gemini_response(prompt: str) -> str:
     """
     Generates content with robust error handling for Rate Limits.
+    Runs entirely on the event loop: backoff sleeps are asyncio sleeps,
+    so a slow or throttled completion never blocks other requests.
+
+    Once the retries are exhausted the error is logged and re-raised (as in
+    ``stream_gemini_response``), so the caller can fail the turn and refund
+    the query.
     """
     try:
-        return _generate_with_retry(prompt)
+        return await _generate_with_retry(prompt)
     except Exception as e:
         print(f"❌ Gemini Generation Failed: {e}")
-        return ""
+        raise
 
 @retry(
     wait=wait_exponential(multiplier=2, min=5, max=60), # Wait 5s, 10s, 20s, 40s...
     stop=stop_after_attempt(5), # Try 5 times (enough to cover the ~18s delay)
     reraise=True 
 )
-def _generate_with_retry(prompt: str) -> str:
+async def _generate_with_retry(prompt: str) -> str:
     # Print a small debug dot to show activity in logs without spamming
     print(".", end="", flush=True)
-    response = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=prompt
-    )
+    async with _get_semaphore():
+        response = await client.aio.models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt
+        )
     return response.text if response.text else ""
+
+
+async def stream_gemini_response(prompt: str):
+    """
+    Async generator yielding the answer text incrementally as Gemini produces it.
+
+    Unlike ``generate_gemini_response`` there is no retry: once the first token
+    has been sent to the client the completion cannot be restarted. Errors are
+    logged and re-raised, so the caller can fail the turn and refund the query.
+    """
+    try:
+        async with _get_semaphore():
+            stream = await client.aio.models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=prompt
+            )
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+    except Exception as e:
+        print(f"❌ Gemini Streaming Failed: {e}")
+        raise
+
+
+async def close_gemini_client():
+    """Release the pooled HTTP connections (called on app shutdown)."""
+    aclose = getattr(client.aio, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -1,4 +1,4 @@
 from app.services.llm.gemini_client import generate_gemini_response
 
-def ask_llm(prompt: str) -> str:
-    return generate_gemini_response(prompt)
+async def ask_llm(prompt: str) -> str:
+    return await generate_gemini_response(prompt)
@@ -30,9 +30,8 @@ Select the {top_n} most relevant chunks that best help answer the question.
 Return ONLY the indices as a comma-separated list.
 """
 
-    response = await ask_llm(prompt)
-
     try:
+        response = await ask_llm(prompt)
         indices = [int(i.strip()) for i in response.split(",")]
         return [contexts[i] for i in indices if i < len(contexts)]
     except Exception:
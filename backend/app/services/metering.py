@@ -0,0 +1,166 @@
+"""
+Usage Metering
+Write-behind counters for per-tenant document usage; atomic query quota.
+
+Document uploads/deletes record increments in memory instead of each
+issuing an `$inc` against the hot `admins` document. A background task
+flushes the accumulated deltas with one `bulk_write` every USAGE_FLUSH_S and
+once more at shutdown. `check_usage_limits` adds the unflushed deltas to the
+persisted counters, so limits stay enforced.
+
+Chat queries are metered synchronously instead: `reserve_query` checks and
+consumes one query atomically before the request runs, and `release_query`
+refunds it if the request fails before generation.
+"""
+
+import os
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict
+
+from pymongo import UpdateOne
+
+from app.db.mongodb import db
+from app.models.subscription import SUBSCRIPTION_TIERS
+from app.services.tenant_profile import invalidate_tenant_profile
+
+logger = logging.getLogger("corpwise.metering")
+
+USAGE_FLUSH_S = float(os.getenv("USAGE_FLUSH_S", "5"))
+
+_pending: Dict[str, Counter] = defaultdict(Counter)  # company_id -> {field: delta}
+_stats = {"recorded": 0, "flushes": 0, "flushed_tenants": 0, "reserved": 0, "released": 0}
+
+
+def record_usage(company_id: str, field: str, increment: int = 1):
+    """
+    Accumulate a usage counter delta (e.g. documents_count) for later bulk persistence.
+
+    Queries are not recorded here: ``reserve_query`` counts them as it admits them.
+    """
+    if not company_id:
+        return
+    _pending[company_id.lower()][field] += increment
+    _stats["recorded"] += 1
+
+
+# =====================================================
+# Atomic query quota (reserve / release)
+# =====================================================
+def _query_limit_expr() -> dict:
+    """Aggregation expression for the tenant's monthly query limit (-1 = unlimited)."""
+    return {
+        "$switch": {
+            "branches": [
+                {
+                    "case": {"$eq": [{"$ifNull": ["$subscription_tier", "starter"]}, tier_id]},
+                    "then": tier["max_queries_per_month"]
+                }
+                for tier_id, tier in SUBSCRIPTION_TIERS.items()
+            ],
+            "default": 0  # Unknown tier: reserve nothing, the caller reports why
+        }
+    }
+
+
+async def reserve_query(company_id: str) -> bool:
+    """
+    Check status, tier limit and monthly count and consume one query, in one round-trip.
+
+    Returns False when the company is missing, inactive or at its limit; nothing
+    is consumed in that case. Concurrent reservations cannot overshoot the limit.
+    """
+    if not company_id:
+        return False
+    limit = _query_limit_expr()
+    used = {"$ifNull": ["$usage.queries_this_month", 0]}
+
+    reserved = await db.admins.find_one_and_update(
+        {
+            "company_id": company_id.lower(),
+            "subscription_status": "active",
+            "$expr": {"$or": [{"$eq": [limit, -1]}, {"$lt": [used, limit]}]}
+        },
+        {
+            "$inc": {"usage.queries_this_month": 1},
+            "$set": {"usage.last_query_date": datetime.utcnow()}
+        },
+        projection={"_id": 1}
+    )
+    if reserved is None:
+        return False
+    _stats["reserved"] += 1
+    return True
+
+
+async def release_query(company_id: str):
+    """Give back a query reserved by ``reserve_query`` that was not consumed."""
+    if not company_id:
+        return
+    await db.admins.update_one(
+        {"company_id": company_id.lower(), "usage.queries_this_month": {"$gt": 0}},
+        {"$inc": {"usage.queries_this_month": -1}}
+    )
+    _stats["released"] += 1
+
+
+def pending_usage(company_id: str, field: str) -> int:
+    """Delta recorded on this worker but not yet flushed to MongoDB."""
+    counts = _pending.get((company_id or "").lower())
+    return counts.get(field, 0) if counts else 0
+
+
+async def flush_usage():
+    """Persist all pending deltas in a single bulk write."""
+    if not _pending:
+        return
+
+    pending = {cid: counts for cid, counts in _pending.items() if any(counts.values())}
+    _pending.clear()
+    if not pending:
+        return
+
+    ops = [
+        UpdateOne({"company_id": company_id}, {"$inc": {f"usage.{field}": n for field, n in counts.items() if n}})
+        for company_id, counts in pending.items()
+    ]
+
+    try:
+        await db.admins.bulk_write(ops, ordered=False)
+    except Exception:
+        # Put the deltas back so the next flush retries them
+        for company_id, counts in pending.items():
+            _pending[company_id].update(counts)
+        raise
+
+    # The persisted totals moved: the next limit check re-reads them
+    for company_id in pending:
+        invalidate_tenant_profile(company_id)
+
+    _stats["flushes"] += 1
+    _stats["flushed_tenants"] += len(pending)
+    print(f"📈 USAGE: Flushed counters for {len(pending)} companies")
+
+
+async def run_usage_flusher():
+    """Background task: flush usage every USAGE_FLUSH_S (and once more on cancel)."""
+    try:
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_S)
+            try:
+                await flush_usage()
+            except Exception as e:
+                logger.warning(f"[METERING] usage flush failed: {e}")
+    finally:
+        await flush_usage()
+
+
+def metering_metrics() -> dict:
+    return {
+        **_stats,
+        "pending_tenants": len(_pending),
+        "pending_increments": sum(sum(c.values()) for c in _pending.values()),
+        "flush_interval_s": USAGE_FLUSH_S,
+    }
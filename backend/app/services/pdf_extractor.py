@@ -0,0 +1,161 @@
+"""
+PDF Text Extraction
+Extracts page text from uploaded PDFs in a process pool.
+
+pypdf's extract_text is pure-Python CPU work; run in the server process it
+holds the GIL and stalls the event loop for seconds on large files. Here a
+PDF is split into ranges of PDF_PAGES_PER_TASK pages, PDF_WORKERS processes
+extract the ranges in parallel, and `PdfPages` yields the page text back in
+page order. At most two ranges per worker are in flight, so memory stays
+bounded however long the document is.
+
+Each page is timed in the worker. Per-document timings are available on the
+`PdfPages` object after iteration, totals through `pdf_metrics`.
+"""
+
+import os
+import time
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, NamedTuple, Optional, Tuple
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_stats = {"documents": 0, "pages": 0, "truncated_documents": 0, "extract_ms": 0.0, "max_page_ms": 0.0}
+
+
+# =====================================================
+# Worker Process Side
+# =====================================================
+
+def _count_pages(file_path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(file_path).pages)
+
+
+def _extract_range(file_path: str, start: int, stop: int) -> List[Tuple[str, float]]:
+    """(text, milliseconds) for pages [start, stop)."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    pages = []
+    for i in range(start, stop):
+        t0 = time.perf_counter()
+        text = reader.pages[i].extract_text() or ""
+        pages.append((text, (time.perf_counter() - t0) * 1000))
+    return pages
+
+
+# =====================================================
+# Server Side
+# =====================================================
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs torch and worker threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        print(f"📑 PDF extraction pool started ({PDF_WORKERS} workers)")
+    return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class PdfPage(NamedTuple):
+    number: int   # 0-based
+    text: str
+    ms: float
+
+
+class PdfPages:
+    """
+    Async iterator over a PDF's pages in order, extracted in the pool.
+
+    ``max_pages`` caps how many pages are read (-1 or None: all of them);
+    ``truncated`` tells whether the cap cut the document short.
+    """
+
+    def __init__(self, file_path: str, max_pages: Optional[int] = None):
+        self.file_path = file_path
+        self.max_pages = max_pages if max_pages is not None and max_pages >= 0 else None
+        self.page_count = 0
+        self.truncated = False
+        self.page_ms: List[float] = []
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+        try:
+            self.page_count = await loop.run_in_executor(pool, _count_pages, self.file_path)
+        except BrokenProcessPool:
+            shutdown_pdf_pool()  # A worker died; start a fresh pool next time
+            raise
+
+        pages = self.page_count
+        if self.max_pages is not None and pages > self.max_pages:
+            pages = self.max_pages
+            self.truncated = True
+
+        ranges = deque((start, min(start + PDF_PAGES_PER_TASK, pages)) for start in range(0, pages, PDF_PAGES_PER_TASK))
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < PDF_WORKERS * 2:
+                    start, stop = ranges.popleft()
+                    in_flight.append((start, loop.run_in_executor(pool, _extract_range, self.file_path, start, stop)))
+
+                start, future = in_flight.popleft()
+                try:
+                    extracted = await future
+                except BrokenProcessPool:
+                    shutdown_pdf_pool()
+                    raise
+                for offset, (text, ms) in enumerate(extracted):
+                    self.page_ms.append(ms)
+                    yield PdfPage(start + offset, text, ms)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+            self._record()
+
+    def _record(self):
+        if not self.page_ms:
+            return
+        _stats["documents"] += 1
+        _stats["pages"] += len(self.page_ms)
+        _stats["truncated_documents"] += self.truncated
+        _stats["extract_ms"] += sum(self.page_ms)
+        _stats["max_page_ms"] = max(_stats["max_page_ms"], max(self.page_ms))
+
+    def summary(self) -> dict:
+        """Page counts and per-page extraction times (ms) for this document."""
+        slowest = max(range(len(self.page_ms)), key=self.page_ms.__getitem__, default=None)
+        return {
+            "page_count": self.page_count,
+            "pages_extracted": len(self.page_ms),
+            "truncated": self.truncated,
+            "extract_ms": round(sum(self.page_ms), 1),
+            "slowest_page": None if slowest is None else {"page": slowest + 1, "ms": round(self.page_ms[slowest], 1)},
+            "page_ms": [round(ms, 1) for ms in self.page_ms],
+        }
+
+
+def pdf_metrics() -> dict:
+    pages = _stats["pages"]
+    return {
+        "workers": PDF_WORKERS,
+        "documents": _stats["documents"],
+        "pages": pages,
+        "truncated_documents": _stats["truncated_documents"],
+        "avg_page_ms": round(_stats["extract_ms"] / pages, 2) if pages else 0.0,
+        "max_page_ms": round(_stats["max_page_ms"], 2),
+    }
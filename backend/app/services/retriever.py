@@ -1,5 +1,26 @@
-from app.db.pinecone_client import get_index
+import asyncio
+
+from app.services.vector_store import get_vector_store
 from app.services.embeddings import embed_text
+from app.services.tenant_profile import resolve_tenant_tier
+
+
+async def _query_tenant_index(query: str, company_id: str, top_k: int):
+    """Embed the query with the tenant's tier model and search its tier index."""
+    tier = await resolve_tenant_tier(company_id)
+    
+    # Get tier-specific store and embed query
+    store = get_vector_store(tier.dimensions)
+    query_vector = await embed_text(query, dimensions=tier.dimensions)
+    
+    # Query with namespace
+    return await asyncio.to_thread(
+        store.query,
+        vector=query_vector,
+        top_k=top_k,
+        namespace=company_id.lower(),
+        include_metadata=True
+    )
 
 
 async def retrieve_context(
@@ -18,29 +39,7 @@ async def retrieve_context(
     Returns:
         Concatenated context from retrieved chunks
     """
-    # Get company tier to determine dimensions
-    from app.db.mongodb import db
-    from app.models.subscription import get_tier_dimensions
-    
-    company = await db.admins.find_one({"company_id": company_id.lower()})
-    
-    # Default to starter if company not found
-    dimensions = 384
-    if company:
-        tier = company.get("subscription_tier", "starter")
-        dimensions = get_tier_dimensions(tier)
-    
-    # Get tier-specific index and embed query
-    index = get_index(dimensions)
-    query_vector = await embed_text(query, dimensions=dimensions)
-    
-    # Query Pinecone with namespace
-    results = index.query(
-        vector=query_vector,
-        top_k=top_k,
-        namespace=company_id.lower(),
-        include_metadata=True
-    )
+    results = await _query_tenant_index(query, company_id, top_k)
     
     contexts = [
         match["metadata"]["text"]
@@ -59,29 +58,7 @@ async def retrieve_with_scores(
     """
     Retrieve context from Pinecone with scores for debugging.
     """
-    # Get company tier to determine dimensions
-    from app.db.mongodb import db
-    from app.models.subscription import get_tier_dimensions
-    
-    company = await db.admins.find_one({"company_id": company_id.lower()})
-    
-    # Default to starter
-    dimensions = 384
-    if company:
-        tier = company.get("subscription_tier", "starter")
-        dimensions = get_tier_dimensions(tier)
-    
-    # Get tier-specific index and embed query
-    index = get_index(dimensions)
-    query_vector = await embed_text(query, dimensions=dimensions)
-    
-    # Query Pinecone with namespace
-    results = index.query(
-        vector=query_vector,
-        top_k=top_k,
-        namespace=company_id.lower(),
-        include_metadata=True
-    )
+    results = await _query_tenant_index(query, company_id, top_k)
     
     # Return raw matches
     return [
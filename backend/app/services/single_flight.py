@@ -0,0 +1,64 @@
+"""
+Single-flight Request Coalescing
+Identical concurrent computations share one in-flight task.
+
+The first caller for a key starts the computation as its own task; callers
+arriving while it is still running await that task instead of starting
+their own. The task is shielded, so a caller that disconnects does not
+cancel the work for everyone else.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger("corpwise.singleflight")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        # Metrics
+        self._leaders = 0
+        self._coalesced = 0
+
+    def get(self, key: Hashable) -> asyncio.Task | None:
+        """The in-flight task for ``key``, if any."""
+        return self._inflight.get(key)
+
+    async def join(self, task: asyncio.Task) -> Any:
+        self._coalesced += 1
+        return await asyncio.shield(task)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn()`` once per key at a time; concurrent callers share its result."""
+        task = self._inflight.get(key)
+        if task is not None:
+            logger.info(f"[SINGLEFLIGHT:{self.name}] coalesced request for {key!r}")
+            return await self.join(task)
+
+        self._leaders += 1
+        task = asyncio.create_task(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        total = self._leaders + self._coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self._leaders,
+            "coalesced": self._coalesced,
+            "coalesced_ratio": round(self._coalesced / total, 3) if total else 0,
+        }
@@ -0,0 +1,82 @@
+"""
+Sparse Lexical Encoder
+BM25-style sparse vectors for sparse-dense hybrid search.
+
+Documents get saturated, length-normalized term frequencies (the BM25 tf
+component); queries get the BM25 IDF of each distinct term over the
+tenant's chunks (`keyword_retriever.term_idf`). Both vectors are
+L2-normalized, so dot(query, doc) is a cosine in [0, 1] like the dense
+score it is mixed with, and rare terms outweigh common ones. Terms come
+from the same tokenizer as the in-process BM25 index and are hashed to
+stable 32-bit indices.
+
+With HYBRID_INGEST=true, process_and_index_document stores a sparse vector
+next to each dense embedding. With HYBRID_ALPHA set, retrieval issues one
+hybrid query (dense weighted by alpha, sparse by 1 - alpha) instead of a
+separate keyword search.
+
+Pinecone only accepts sparse values on indexes created with the dotproduct
+metric. This repo does not create the Pinecone indexes: they must be
+provisioned with metric="dotproduct" for hybrid search. On any other metric
+the Pinecone store reports no hybrid support and ingestion and retrieval
+stay dense-only (with a warning at first use).
+"""
+
+import os
+import math
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.services.keyword_retriever import BM25_B, BM25_K1, tokenize
+
+HYBRID_INGEST = os.getenv("HYBRID_INGEST", "false").lower() == "true"
+_alpha = os.getenv("HYBRID_ALPHA")
+HYBRID_ALPHA: Optional[float] = float(_alpha) if _alpha else None  # None = separate keyword search
+
+# Typical chunk length in tokens (after stopword removal) for length normalization
+SPARSE_AVG_DOC_TOKENS = float(os.getenv("SPARSE_AVG_DOC_TOKENS", "250"))
+
+SparseVector = Dict[str, List]  # {"indices": [int], "values": [float]}
+
+
+def _term_index(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _sparse(weights: Dict[int, float]) -> SparseVector:
+    """L2-normalized sparse vector from index -> weight."""
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    indices = sorted(weights)
+    return {"indices": indices, "values": [float(weights[i] / norm) for i in indices]}
+
+
+def encode_document(text: str) -> SparseVector:
+    tokens = tokenize(text)
+    if not tokens:
+        return {"indices": [], "values": []}
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / SPARSE_AVG_DOC_TOKENS)
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(tokens).items():
+        idx = _term_index(term)
+        weights[idx] = weights.get(idx, 0.0) + tf * (BM25_K1 + 1) / (tf + norm)
+    return _sparse(weights)
+
+
+def encode_query(text: str, idf: Optional[Dict[str, float]] = None) -> SparseVector:
+    """Query vector weighted by ``idf`` (term -> weight; uniform without it)."""
+    weights: Dict[int, float] = {}
+    for term in set(tokenize(text)):
+        idx = _term_index(term)
+        weights[idx] = weights.get(idx, 0.0) + (idf.get(term, 1.0) if idf else 1.0)
+    return _sparse(weights)
+
+
+def hybrid_scale(dense: List[float], sparse: SparseVector, alpha: float):
+    """Convex combination: alpha weights the dense side, 1 - alpha the sparse side."""
+    if not 0 <= alpha <= 1:
+        raise ValueError("HYBRID_ALPHA must be between 0 and 1")
+    return (
+        [v * alpha for v in dense],
+        {"indices": sparse["indices"], "values": [v * (1 - alpha) for v in sparse["values"]]}
+    )
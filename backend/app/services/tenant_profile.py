@@ -0,0 +1,107 @@
+"""
+Tenant Profile Cache
+Short-TTL, in-process cache of `admins` documents keyed by company_id.
+
+One chat request needs the tenant's status, tier, usage and API keys in
+several places (usage limits, API key auth, tier dimensions). They all read
+through this cache instead of each issuing its own `find_one`. Endpoints that
+change tier, status or keys call `invalidate_tenant_profile`; other workers
+pick the change up within TENANT_PROFILE_TTL_S (API key revocation is
+checked against Mongo on every use, see `verify_api_key`).
+
+`resolve_tenant_tier` maps a company to the embedding dimensions, model and
+Pinecone index its vectors live in, on top of the same cache.
+"""
+
+import os
+import time
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+from app.db.mongodb import db
+from app.models.subscription import get_tier_dimensions, get_tier_pdf_page_limit
+from app.services.single_flight import SingleFlight
+
+TENANT_PROFILE_TTL_S = float(os.getenv("TENANT_PROFILE_TTL_S", "30"))
+
+_profiles: Dict[str, tuple] = {}  # company_id -> (expires_at, profile or None)
+_generations: Dict[str, int] = {}  # company_id -> invalidation count
+_loads = SingleFlight("tenant-profile")
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+async def _load(company_id: str, generation: int) -> Optional[dict]:
+    profile = await db.admins.find_one({"company_id": company_id})
+    # Invalidated while reading: the result may predate the change, don't cache it
+    if _generations.get(company_id, 0) == generation:
+        _profiles[company_id] = (time.monotonic() + TENANT_PROFILE_TTL_S, profile)
+    return profile
+
+
+async def get_tenant_profile(company_id: str) -> Optional[dict]:
+    """
+    Cached `admins` document for a company (None if it does not exist).
+    The returned dict is shared: treat it as read-only.
+    """
+    if not company_id:
+        return None
+    company_id = company_id.lower()
+
+    entry = _profiles.get(company_id)
+    if entry is not None and entry[0] > time.monotonic():
+        _stats["hits"] += 1
+        return entry[1]
+
+    _stats["misses"] += 1
+    # Concurrent misses for the same tenant share one Mongo read; misses after an
+    # invalidation start a new one instead of joining a read that may be stale
+    generation = _generations.get(company_id, 0)
+    return await _loads.do((company_id, generation), lambda: _load(company_id, generation))
+
+
+def invalidate_tenant_profile(company_id: str):
+    """Forget the cached profile after its tier, status or API keys change."""
+    if company_id:
+        company_id = company_id.lower()
+        _generations[company_id] = _generations.get(company_id, 0) + 1
+        _profiles.pop(company_id, None)
+        _stats["invalidations"] += 1
+
+
+# =====================================================
+# Tier resolution (company -> dimensions, model, index)
+# =====================================================
+class TenantTier(NamedTuple):
+    tier: str
+    dimensions: int
+    model: str
+    index_name: str
+    max_pdf_pages: int  # -1 = unlimited
+
+
+@lru_cache(maxsize=None)
+def tier_spec(tier: str = "starter") -> TenantTier:
+    """Embedding dimensions, model, Pinecone index and PDF page cap of a subscription tier."""
+    from app.db.pinecone_client import INDEX_NAMES
+    from app.services.embeddings import MODEL_MAP
+
+    dimensions = get_tier_dimensions(tier)
+    return TenantTier(tier, dimensions, MODEL_MAP[dimensions], INDEX_NAMES[dimensions], get_tier_pdf_page_limit(tier))
+
+
+async def resolve_tenant_tier(company_id: str = None) -> TenantTier:
+    """
+    Tier spec for a company. Unknown companies (and the global namespace)
+    resolve to the starter tier.
+    """
+    profile = await get_tenant_profile(company_id)
+    tier = (profile or {}).get("subscription_tier", "starter")
+    return tier_spec(tier)
+
+
+def tenant_profile_metrics() -> dict:
+    return {
+        **_stats,
+        "cached_tenants": len(_profiles),
+        "ttl_s": TENANT_PROFILE_TTL_S,
+    }
@@ -0,0 +1,144 @@
+"""
+Vector Upsert Pipeline
+Sends vectors to the vector store in size-bounded batches, several at a time.
+
+Pinecone rejects upsert requests over 2 MB (or 1000 vectors); with 1024-dim
+vectors and the chunk text in metadata, a fixed count of 500 can exceed
+that. Batches are packed by estimated request size instead, up to
+UPSERT_CONCURRENCY batches are in flight across the whole process, and a
+failed batch is retried on its own with exponential backoff (split in half
+if the store says it is too large). Throughput is reported in vectors/sec.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Iterator, List
+
+from app.services.vector_store import Vector, VectorStore
+
+logger = logging.getLogger("corpwise.upsert")
+
+# Headroom under Pinecone's 2 MB request limit for the request envelope
+UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", str(1_800_000)))
+UPSERT_MAX_BATCH_VECTORS = int(os.getenv("UPSERT_MAX_BATCH_VECTORS", "1000"))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "4"))
+UPSERT_RETRY_BASE_S = float(os.getenv("UPSERT_RETRY_BASE_S", "0.5"))
+
+# Serialized size of one float value (JSON repr of a float32 as a double, plus separator)
+_BYTES_PER_VALUE = 22
+_BYTES_PER_SPARSE_ENTRY = 32
+_BYTES_PER_VECTOR_OVERHEAD = 64
+
+_semaphore: asyncio.Semaphore | None = None
+_stats = {"vectors": 0, "batches": 0, "retries": 0, "split_batches": 0, "failed_batches": 0, "busy_s": 0.0}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+    return _semaphore
+
+
+def estimate_vector_bytes(vector: Vector) -> int:
+    """Rough upper bound of a vector's share of an upsert request body."""
+    size = _BYTES_PER_VECTOR_OVERHEAD + len(vector[0]) + len(vector[1]) * _BYTES_PER_VALUE
+    size += len(json.dumps(vector[2], ensure_ascii=False, default=str).encode("utf-8"))
+    if len(vector) > 3 and vector[3]:
+        size += len(vector[3]["indices"]) * _BYTES_PER_SPARSE_ENTRY
+    return size
+
+
+def pack_batches(
+    vectors: List[Vector],
+    max_bytes: int = UPSERT_MAX_BATCH_BYTES,
+    max_vectors: int = UPSERT_MAX_BATCH_VECTORS
+) -> Iterator[List[Vector]]:
+    """Greedy, order-preserving batches under both the byte and count limits."""
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        size = estimate_vector_bytes(vector)
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_vectors):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def _too_large(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(s in message for s in ("too large", "exceeds", "413", "message length", "request size"))
+
+
+async def _send(store: VectorStore, batch: List[Vector], namespace: str, report: dict):
+    for attempt in range(UPSERT_MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                await asyncio.to_thread(store.upsert, batch, namespace=namespace)
+            report["batches"] += 1
+            return
+        except Exception as e:
+            if _too_large(e) and len(batch) > 1:
+                # The size estimate was off for this payload: send it as two requests
+                _stats["split_batches"] += 1
+                half = len(batch) // 2
+                await asyncio.gather(
+                    _send(store, batch[:half], namespace, report),
+                    _send(store, batch[half:], namespace, report)
+                )
+                return
+            if attempt == UPSERT_MAX_RETRIES:
+                _stats["failed_batches"] += 1
+                raise
+            report["retries"] += 1
+            delay = UPSERT_RETRY_BASE_S * (2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"[UPSERT] batch of {len(batch)} failed ({e}); retry {attempt + 1}/{UPSERT_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def upsert_vectors(store: VectorStore, vectors: List[Vector], namespace: str = "") -> dict:
+    """
+    Upsert ``vectors`` in size-packed batches with bounded parallelism.
+
+    Raises if a batch still fails after UPSERT_MAX_RETRIES; batches that
+    already succeeded stay written (upserts are idempotent per id).
+    """
+    report = {"vectors": len(vectors), "batches": 0, "retries": 0, "seconds": 0.0}
+    if not vectors:
+        return report
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(_send(store, batch, namespace, report)) for batch in pack_batches(vectors)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        report["seconds"] = time.perf_counter() - start
+        _stats["batches"] += report["batches"]
+        _stats["retries"] += report["retries"]
+        _stats["busy_s"] += report["seconds"]
+
+    _stats["vectors"] += len(vectors)
+    return report
+
+
+def upsert_metrics() -> dict:
+    busy = _stats["busy_s"]
+    return {
+        **{k: v for k, v in _stats.items() if k != "busy_s"},
+        "concurrency": UPSERT_CONCURRENCY,
+        "max_batch_bytes": UPSERT_MAX_BATCH_BYTES,
+        "vectors_per_s": round(_stats["vectors"] / busy, 1) if busy else 0.0,
+    }
@@ -1,10 +1,555 @@
-from backend.app.db.pinecone_client import get_index
-from app.services.embeddings import embed_text
+"""
+Vector Store
+Backend-agnostic access to the tenant vector indexes.
 
-index = get_index()
+Every caller goes through `get_vector_store(dimensions)` instead of the
+Pinecone SDK directly. Two backends implement the same small interface
+(upsert, query, delete by ids, delete namespace, stats):
 
-async def upsert_document(doc_id: str, text: str, metadata: dict):
-    vector = embed_text(text)
-    index.upsert([
-        (doc_id, vector, metadata)
-    ])
+- "pinecone" (default): the managed per-tier indexes from db/pinecone_client.
+- "local": exact NumPy search over memory-mapped per-namespace snapshots
+  under VECTOR_STORE_PATH, with an append log for changes (see below).
+  Lets small tenants skip the network hop and lets retrieval be
+  benchmarked and tested offline.
+
+Methods are synchronous (like the Pinecone SDK); async callers run them via
+`asyncio.to_thread`. Query results use Pinecone's shape:
+``{"matches": [{"id", "score", "metadata"}], "namespace"}``.
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker, no inter-process lock needed
+    fcntl = None
+
+logger = logging.getLogger("corpwise.vector_store")
+
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+VECTOR_STORE_PATH = Path(os.getenv("VECTOR_STORE_PATH", "vector_store"))
+
+# (id, values, metadata) or (id, values, metadata, sparse_values)
+Vector = Tuple[str, Sequence[float], dict]
+
+
+class VectorStore:
+    """Interface shared by the vector store backends."""
+
+    backend = "base"
+    supports_hybrid = False  # Accepts sparse_values on upsert and sparse_vector on query
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def upsert(self, vectors: List[Vector], namespace: str = "") -> int:
+        raise NotImplementedError
+
+    def query(self, vector: Sequence[float], top_k: int = 10, namespace: str = "",
+              include_metadata: bool = True, sparse_vector: dict = None,
+              include_values: bool = False) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str], namespace: str = ""):
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace: str):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+# =====================================================
+# Pinecone backend
+# =====================================================
+class PineconeVectorStore(VectorStore):
+    """Thin adapter over the tier's Pinecone index."""
+
+    backend = "pinecone"
+
+    def __init__(self, dimensions: int):
+        super().__init__(dimensions)
+        from app.db.pinecone_client import get_index
+        self.index = get_index(dimensions)
+        self._hybrid: Optional[bool] = None
+
+    @property
+    def supports_hybrid(self) -> bool:
+        """Whether this tier's index takes sparse values (dotproduct metric); looked up once."""
+        if self._hybrid is None:
+            from app.db.pinecone_client import get_index_name, pc
+            name = get_index_name(self.dimensions)
+            try:
+                metric = pc.describe_index(name).metric
+            except Exception as e:
+                logger.warning(f"[VECTOR_STORE] could not read the metric of '{name}', assuming dotproduct: {e}")
+                return True
+            self._hybrid = metric == "dotproduct"
+            if not self._hybrid:
+                print(f"⚠️ Pinecone index '{name}' uses the {metric} metric; hybrid search needs dotproduct. "
+                      f"Sparse vectors are disabled for {self.dimensions} dims")
+        return self._hybrid
+
+    def upsert(self, vectors: List[Vector], namespace: str = "") -> int:
+        if any(len(v) > 3 for v in vectors):
+            # The SDK only takes sparse values in the dict form
+            vectors = [
+                {"id": v[0], "values": v[1], "metadata": v[2], **({"sparse_values": v[3]} if len(v) > 3 else {})}
+                for v in vectors
+            ]
+        self.index.upsert(vectors=vectors, namespace=namespace)
+        return len(vectors)
+
+    def query(self, vector: Sequence[float], top_k: int = 10, namespace: str = "",
+              include_metadata: bool = True, sparse_vector: dict = None,
+              include_values: bool = False) -> Dict[str, Any]:
+        kwargs = {"sparse_vector": sparse_vector} if sparse_vector and sparse_vector["indices"] else {}
+        return self.index.query(
+            vector=list(vector),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=include_values,
+            namespace=namespace,
+            **kwargs
+        )
+
+    def delete(self, ids: List[str], namespace: str = ""):
+        self.index.delete(ids=ids, namespace=namespace)
+
+    def delete_namespace(self, namespace: str):
+        self.index.delete(delete_all=True, namespace=namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.index.describe_index_stats()
+        stats = stats.to_dict() if hasattr(stats, "to_dict") else dict(stats)
+        return {"backend": self.backend, **stats}
+
+
+# =====================================================
+# Local backend: memory-mapped snapshot + append log
+# =====================================================
+# Layout of one namespace directory ({VECTOR_STORE_PATH}/{dims}/{namespace}/):
+#
+#   CURRENT              generation number of the live snapshot/log pair
+#   snap-{gen}/          immutable snapshot, memory-mapped read-only
+#       vectors.npy      (n, dims) float32, L2-normalized
+#       ids.npy          (n,) fixed-width unicode vector ids
+#       offsets.npy      (n + 1,) int64 byte offsets into records.jsonl
+#       records.jsonl    one metadata JSON object per row
+#   log-{gen}.jsonl      upserts/deletes applied since the snapshot was cut
+#
+# Snapshot pages live in the OS page cache, so every worker process shares
+# one copy; per-worker RAM is just the replayed log tail and an alive mask.
+# Writers append to the log under an inter-process file lock; compaction folds
+# the log into a new snapshot generation and switches CURRENT atomically.
+# The generation it replaces stays on disk until the next switch, so a worker
+# still reading it (or about to open it) never finds its files gone.
+VECTOR_LOG_COMPACT_BYTES = int(os.getenv("VECTOR_LOG_COMPACT_BYTES", str(8 * 1024 * 1024)))
+VECTOR_COMPACT_INTERVAL_S = float(os.getenv("VECTOR_COMPACT_INTERVAL_S", "60"))
+
+
+def _normalize(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+    return rows / np.maximum(norms, 1e-12)
+
+
+@contextmanager
+def _file_lock(directory: Path):
+    """Exclusive lock shared by all worker processes writing to one namespace."""
+    with open(directory / "LOCK", "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _read_generation(directory: Path) -> int:
+    try:
+        return int((directory / "CURRENT").read_text().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_snapshot(directory: Path, gen: int, ids: List[str], vectors: np.ndarray, records: List[bytes]):
+    """Write snap-{gen} (via a temp dir + rename so readers never see it half-written)."""
+    tmp = directory / f"snap-{gen}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    with open(tmp / "records.jsonl", "wb") as f:
+        for i, line in enumerate(records):
+            f.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+
+    np.save(tmp / "vectors.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+    np.save(tmp / "ids.npy", np.asarray(ids, dtype=str) if ids else np.empty(0, dtype="<U1"))
+    np.save(tmp / "offsets.npy", offsets)
+    os.replace(tmp, directory / f"snap-{gen}")
+
+
+class _MappedNamespace:
+    """One worker's view of a namespace: mapped snapshot plus replayed log tail."""
+
+    def __init__(self, directory: Path, dimensions: int):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.gen = -1
+        self._open(_read_generation(directory))
+
+    # ---------- snapshot ----------
+    def _open(self, gen: int):
+        self.gen = gen
+        snap = self.directory / f"snap-{gen}"
+        if snap.exists():
+            self.vectors = np.load(snap / "vectors.npy", mmap_mode="r")
+            self.ids = np.load(snap / "ids.npy", mmap_mode="r")
+            self.offsets = np.load(snap / "offsets.npy", mmap_mode="r")
+        else:
+            self.vectors = np.empty((0, self.dimensions), dtype=np.float32)
+            self.ids = np.empty(0, dtype="<U1")
+            self.offsets = np.zeros(1, dtype=np.int64)
+        self.records_path = snap / "records.jsonl"
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+        # Log tail: id -> (vector, metadata), insertion-ordered
+        self.overlay: Dict[str, Tuple[np.ndarray, dict]] = {}
+        self._overlay_matrix = None
+        self.log_path = self.directory / f"log-{gen}.jsonl"
+        self.log_pos = 0
+
+    def refresh(self):
+        """Pick up a new snapshot generation and any log entries written by other workers."""
+        gen = _read_generation(self.directory)
+        if gen != self.gen:
+            self._open(gen)
+
+        try:
+            size = self.log_path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size <= self.log_pos:
+            return
+
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_pos)
+            data = f.read(size - self.log_pos)
+        # Only replay complete lines; a concurrent append may be mid-write
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self.log_pos += end
+
+    # ---------- log replay ----------
+    def _shadow(self, ids: List[str]):
+        """Hide snapshot rows superseded or deleted by log entries."""
+        if len(self.ids) and ids:
+            self.alive &= ~np.isin(self.ids, ids)
+
+    def _apply(self, entry: dict):
+        if entry["op"] == "upsert":
+            ids = [v[0] for v in entry["vectors"]]
+            self._shadow(ids)
+            for vec_id, values, meta in entry["vectors"]:
+                self.overlay.pop(vec_id, None)
+                self.overlay[vec_id] = (np.asarray(values, dtype=np.float32), meta)
+        elif entry["op"] == "delete":
+            self._shadow(entry["ids"])
+            for vec_id in entry["ids"]:
+                self.overlay.pop(vec_id, None)
+        self._overlay_matrix = None
+
+    # ---------- reads ----------
+    def count(self) -> int:
+        return int(self.alive.sum()) + len(self.overlay)
+
+    def _record(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        with open(self.records_path, "rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def query(self, q: np.ndarray, top_k: int, include_metadata: bool, include_values: bool = False) -> List[dict]:
+        candidates = []  # (score, in_snapshot, row or id)
+
+        if len(self.ids):
+            scores = np.asarray(self.vectors @ q)
+            scores[~self.alive] = -np.inf
+            k = min(top_k, int(self.alive.sum()))
+            if k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                candidates += [(float(scores[r]), True, int(r)) for r in top]
+
+        if self.overlay:
+            if self._overlay_matrix is None:
+                self._overlay_matrix = np.vstack([v for v, _ in self.overlay.values()])
+            overlay_ids = list(self.overlay)
+            scores = self._overlay_matrix @ q
+            candidates += [(float(s), False, overlay_ids[i]) for i, s in enumerate(scores)]
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        matches = []
+        for score, in_snapshot, ref in candidates[:top_k]:
+            match = {"id": str(self.ids[ref]) if in_snapshot else ref, "score": score}
+            if include_metadata:
+                match["metadata"] = self._record(ref) if in_snapshot else self.overlay[ref][1]
+            if include_values:
+                match["values"] = (self.vectors[ref] if in_snapshot else self.overlay[ref][0]).tolist()
+            matches.append(match)
+        return matches
+
+    # ---------- compaction ----------
+    def compact(self):
+        """Fold the log into snapshot gen+1. Caller holds the namespace file lock."""
+        self.refresh()
+        ids, rows, records = [], [], []
+
+        alive_rows = np.flatnonzero(self.alive)
+        if len(alive_rows):
+            ids += [str(self.ids[r]) for r in alive_rows]
+            rows.append(np.asarray(self.vectors[alive_rows]))
+            with open(self.records_path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+            records += [lines[r] for r in alive_rows]
+
+        for vec_id, (vec, meta) in self.overlay.items():
+            ids.append(vec_id)
+            rows.append(vec[None, :])
+            records.append(json.dumps(meta).encode() + b"\n")
+
+        vectors = np.vstack(rows) if rows else np.empty((0, self.dimensions), dtype=np.float32)
+        self.switch(self.gen + 1, ids, vectors, records)
+
+    def switch(self, gen: int, ids: List[str], vectors: np.ndarray, records: List[bytes]):
+        """
+        Publish a new generation and drop the ones before the generation it
+        replaces. Caller holds the file lock.
+        """
+        if ids:
+            _write_snapshot(self.directory, gen, ids, vectors, records)
+        (self.directory / f"log-{gen}.jsonl").touch()
+
+        tmp = self.directory / "CURRENT.tmp"
+        tmp.write_text(str(gen))
+        os.replace(tmp, self.directory / "CURRENT")
+        self._open(gen)
+
+        # Other workers may still be reading the generation just replaced (it
+        # no longer changes: writers append to the new log). Every worker
+        # refreshes before each read, so none is still on an older one.
+        for path in self.directory.glob("*-*"):
+            stem = path.name.split(".")[0]
+            kind, _, number = stem.partition("-")
+            if kind not in ("snap", "log") or not number.isdigit() or int(number) >= gen - 1:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    pass  # Windows cannot unlink a file another process has open
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Exact cosine search over per-namespace memory-mapped snapshots.
+
+    Mutations are appended to the namespace's log (and replayed by every
+    worker on its next read); `compact` folds a long log into a fresh
+    snapshot. Opening a namespace maps its snapshot instead of loading it,
+    so startup time and RSS do not grow with the corpus.
+    """
+
+    backend = "local"
+
+    def __init__(self, dimensions: int, path: Path = VECTOR_STORE_PATH):
+        super().__init__(dimensions)
+        self.path = Path(path) / str(dimensions)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._namespaces: Dict[str, _MappedNamespace] = {}
+        self._lock = threading.Lock()
+
+    # Namespaces are company ids; quote them so any id is a safe directory name
+    def _dir(self, namespace: str) -> Path:
+        return self.path / quote(namespace or "__default__", safe="")
+
+    def _open(self, namespace: str) -> _MappedNamespace:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            directory = self._dir(namespace)
+            directory.mkdir(exist_ok=True)
+            ns = _MappedNamespace(directory, self.dimensions)
+            self._namespaces[namespace] = ns
+        ns.refresh()
+        return ns
+
+    def _append(self, namespace: str, entry: dict):
+        line = (json.dumps(entry) + "\n").encode()
+        with self._lock:
+            ns = self._open(namespace)
+            with _file_lock(ns.directory):
+                ns.refresh()  # CURRENT may have moved while we waited for the lock
+                with open(ns.log_path, "ab") as f:
+                    f.write(line)
+            ns.refresh()
+
+    # ---------- interface ----------
+    def upsert(self, vectors: List[Vector], namespace: str = "") -> int:
+        if not vectors:
+            return 0
+        rows = _normalize(np.asarray([v[1] for v in vectors], dtype=np.float32))
+        if rows.shape[1] != self.dimensions:
+            raise ValueError(f"Vector dimension {rows.shape[1]} does not match index dimension {self.dimensions}")
+
+        self._append(namespace, {
+            "op": "upsert",
+            "vectors": [
+                [v[0], row.tolist(), dict(v[2]) if len(v) > 2 and v[2] else {}]
+                for v, row in zip(vectors, rows)
+            ]
+        })
+        return len(vectors)
+
+    def query(self, vector: Sequence[float], top_k: int = 10, namespace: str = "",
+              include_metadata: bool = True, sparse_vector: dict = None,
+              include_values: bool = False) -> Dict[str, Any]:
+        # Dense only: sparse values are not stored locally (supports_hybrid = False)
+        q = _normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            matches = self._open(namespace).query(q, top_k, include_metadata, include_values)
+        return {"matches": matches, "namespace": namespace}
+
+    def delete(self, ids: List[str], namespace: str = ""):
+        if ids:
+            self._append(namespace, {"op": "delete", "ids": list(ids)})
+
+    def delete_namespace(self, namespace: str):
+        with self._lock:
+            ns = self._open(namespace)
+            with _file_lock(ns.directory):
+                ns.switch(_read_generation(ns.directory) + 1, [], None, [])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {}
+            for directory in self.path.iterdir():
+                if directory.is_dir():
+                    name = unquote(directory.name)
+                    name = "" if name == "__default__" else name
+                    count = self._open(name).count()
+                    if count:
+                        namespaces[name] = {"vector_count": count}
+        return {
+            "backend": self.backend,
+            "dimension": self.dimensions,
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+    # ---------- maintenance ----------
+    def rebuild(self, vectors: List[Vector], namespace: str = "") -> int:
+        """Replace a namespace with a fresh snapshot of ``vectors`` (no log replay)."""
+        ids = [v[0] for v in vectors]
+        rows = (
+            _normalize(np.asarray([v[1] for v in vectors], dtype=np.float32))
+            if vectors else np.empty((0, self.dimensions), dtype=np.float32)
+        )
+        records = [json.dumps(dict(v[2]) if len(v) > 2 and v[2] else {}).encode() + b"\n" for v in vectors]
+        with self._lock:
+            ns = self._open(namespace)
+            with _file_lock(ns.directory):
+                ns.switch(_read_generation(ns.directory) + 1, ids, rows, records)
+        return len(ids)
+
+    def compact(self, namespace: str = "", min_log_bytes: int = 0) -> bool:
+        """Fold the namespace's log into a new snapshot if it has grown past ``min_log_bytes``."""
+        with self._lock:
+            ns = self._open(namespace)
+            with _file_lock(ns.directory):
+                # Another worker may have compacted while we waited for the lock
+                ns.refresh()
+                size = ns.log_path.stat().st_size if ns.log_path.exists() else 0
+                if size == 0 or size < min_log_bytes:
+                    return False
+                ns.compact()
+        print(f"🗜️ Compacted local vector index '{namespace}' ({self.dimensions} dims, {size / 1024:.0f} KB log)")
+        return True
+
+    def compact_all(self, min_log_bytes: int = VECTOR_LOG_COMPACT_BYTES) -> int:
+        compacted = 0
+        for directory in list(self.path.iterdir()):
+            if directory.is_dir():
+                name = unquote(directory.name)
+                compacted += self.compact("" if name == "__default__" else name, min_log_bytes)
+        return compacted
+
+
+async def run_vector_compactor():
+    """Background task: compact local index logs every VECTOR_COMPACT_INTERVAL_S."""
+    while True:
+        await asyncio.sleep(VECTOR_COMPACT_INTERVAL_S)
+        for dim_dir in VECTOR_STORE_PATH.glob("*"):
+            if not dim_dir.name.isdigit():
+                continue
+            try:
+                store = get_vector_store(int(dim_dir.name), backend="local")
+                await asyncio.to_thread(store.compact_all)
+            except Exception as e:
+                logger.warning(f"[VECTOR_STORE] compaction failed for {dim_dir.name} dims: {e}")
+
+
+# =====================================================
+# Store selection
+# =====================================================
+_BACKENDS = {
+    "pinecone": PineconeVectorStore,
+    "local": LocalVectorStore,
+}
+
+_stores: Dict[Tuple[str, int], VectorStore] = {}
+
+
+def supports_hybrid(backend: Optional[str] = None, dimensions: Optional[int] = None) -> bool:
+    """
+    Whether the configured backend can run sparse-dense hybrid queries; with
+    ``dimensions``, whether that tier's index can (Pinecone: dotproduct metric).
+    """
+    if dimensions is not None:
+        return get_vector_store(dimensions, backend=backend).supports_hybrid
+    store_cls = _BACKENDS.get((backend or VECTOR_STORE_BACKEND).lower())
+    return bool(store_cls and store_cls.supports_hybrid)
+
+
+def get_vector_store(dimensions: int = 384, backend: Optional[str] = None) -> VectorStore:
+    """
+    Vector store for a tier's dimensions, using VECTOR_STORE_BACKEND unless
+    ``backend`` is given. Instances are cached per (backend, dimensions).
+    """
+    backend = (backend or VECTOR_STORE_BACKEND).lower()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown vector store backend: {backend}. Must be one of {list(_BACKENDS)}")
+
+    key = (backend, dimensions)
+    store = _stores.get(key)
+    if store is None:
+        store = _BACKENDS[backend](dimensions)
+        _stores[key] = store
+        print(f"📌 Vector store: {backend} ({dimensions} dims)")
+    return store
@@ -0,0 +1,187 @@
+"""
+Benchmark a chat turn against stand-in backends.
+
+Compares the old sequential stage order (cache -> history -> embed ->
+semantic -> keyword -> persist) with chat_orchestrator.process_chat, the
+path the /chat endpoint runs: history read alongside the prefetch, request
+coalescing, the concurrent fan-out and persistence. Every backend is
+replaced by an asyncio.sleep with a jittered latency, so no MongoDB,
+Pinecone, model download or Gemini call is needed. Generation returns at
+once: it takes the same time in both orders.
+
+Usage:
+    python scripts/benchmark_retrieval.py --iterations 200
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+# Add backend root to path so 'app' imports work
+backend_root = Path(__file__).parent.parent
+sys.path.append(str(backend_root))
+
+# Clients are constructed at import time but never contacted by this script
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("PINECONE_API_KEY", "benchmark")
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "corpwise_benchmark")
+
+from app.services import chat_orchestrator
+
+
+# Median latencies (ms) of each backend as seen from the API server
+STAGE_LATENCY_MS = {
+    "cache": 4,       # response_cache.find_one
+    "history": 5,     # conversations.find_one
+    "embed": 25,      # embed_text of the query (embedding cache miss)
+    "semantic": 45,   # Pinecone query
+    "keyword": 12,    # BM25 search (index load amortized)
+    "persist": 6,     # conversations.update_one
+}
+
+# Query embeddings of the current turn (stands in for the embedding cache)
+_embedded = set()
+
+
+async def stand_in(stage: str):
+    # Log-normal jitter gives a realistic long tail for p95
+    base = STAGE_LATENCY_MS[stage]
+    await asyncio.sleep(base * random.lognormvariate(0, 0.35) / 1000)
+
+
+async def fake_cached_response(question, company_id=None):
+    await stand_in("cache")
+    return None
+
+
+async def fake_recent_messages(conversation_id, limit=5):
+    await stand_in("history")
+    return []
+
+
+async def fake_resolve_tenant_tier(company_id=None):
+    return SimpleNamespace(tier="starter", dimensions=384)  # Tenant profile cache hit
+
+
+async def fake_embed_text(text, dimensions=384):
+    if text not in _embedded:
+        await stand_in("embed")
+        _embedded.add(text)
+    return [0.0] * dimensions
+
+
+async def fake_semantic_search(query, company_id, top_k=15, alpha=None):
+    await fake_embed_text(chat_orchestrator.normalize_query(query))
+    await stand_in("semantic")
+    return [
+        {
+            # The vector store returns match values, so MMR needs no extra lookups
+            "vector": np.random.default_rng(i).standard_normal(384).astype(np.float32).tolist(),
+            "text": f"Employees receive {20 + i} days of paid leave per year.",
+            "source": f"hr/handbook_{i}.md",
+            "section": "leave",
+            "doc_id": f"doc-{i}",
+            "doc_type": "hr",
+            "score": 0.8 - i * 0.05,
+            "type": "semantic",
+        }
+        for i in range(5)
+    ]
+
+
+async def fake_keyword_search(query, company_id=None, limit=5):
+    await stand_in("keyword")
+    return []
+
+
+async def fake_rerank(query, chunks, top_k=3):
+    for c in chunks:
+        c["ce_score"] = 5.0
+    return chunks[:top_k]
+
+
+async def fake_generate(prompt):
+    return "Employees receive 20 days of paid leave per year."
+
+
+async def fake_negative_log(**kwargs):
+    pass
+
+
+class FakeConversations:
+    async def update_one(self, *args, **kwargs):
+        await stand_in("persist")
+
+
+async def sequential_turn(question: str, company_id: str):
+    """The pre-fan-out order: every stage waits for the previous one."""
+    await fake_cached_response(question, company_id)
+    await fake_recent_messages("bench")
+    await fake_semantic_search(question, company_id)
+    await fake_keyword_search(question, company_id)
+    await fake_generate(question)
+    await FakeConversations().update_one()
+
+
+async def concurrent_turn(question: str, company_id: str):
+    await chat_orchestrator.process_chat("bench-user", "bench", question, company_id=company_id)
+
+
+async def measure(fn, iterations: int) -> list[float]:
+    question = "how many leave days do I get"
+    samples = []
+    for _ in range(iterations):
+        _embedded.clear()  # Every turn embeds a new question
+        start = time.perf_counter()
+        await fn(question, "acme")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(label: str, samples: list[float]) -> dict:
+    q = statistics.quantiles(samples, n=100)
+    stats = {"p50": q[49], "p95": q[94], "mean": statistics.mean(samples)}
+    print(f"{label:<12} p50={stats['p50']:7.2f}ms  p95={stats['p95']:7.2f}ms  mean={stats['mean']:7.2f}ms")
+    return stats
+
+
+async def main(iterations: int):
+    chat_orchestrator.get_cached_response = fake_cached_response
+    chat_orchestrator.get_recent_messages = fake_recent_messages
+    chat_orchestrator.semantic_search = fake_semantic_search
+    chat_orchestrator.keyword_search = fake_keyword_search
+    chat_orchestrator.cross_encoder_rerank = fake_rerank
+    chat_orchestrator.resolve_tenant_tier = fake_resolve_tenant_tier
+    chat_orchestrator.embed_text = fake_embed_text
+    chat_orchestrator.generate_gemini_response = fake_generate
+    chat_orchestrator.log_negative_retrieval = fake_negative_log
+    chat_orchestrator.db = SimpleNamespace(conversations=FakeConversations())
+
+    print(f"\n⏱️  Chat turn benchmark ({iterations} iterations, stand-in backends)")
+    print(f"   Stage medians (ms): {STAGE_LATENCY_MS}\n")
+
+    seq = summarize("sequential", await measure(sequential_turn, iterations))
+    con = summarize("concurrent", await measure(concurrent_turn, iterations))
+
+    print(
+        f"\n🚀 Speedup: p50 {seq['p50'] / con['p50']:.2f}x | p95 {seq['p95'] / con['p95']:.2f}x"
+        " (concurrent figures include prompt building, fusion and calibration CPU time)\n"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main(args.iterations))
@@ -0,0 +1,86 @@
+"""
+Build Local Vector Indexes from MongoDB Chunks
+
+Writes a fresh memory-mapped snapshot per (dimensions, company) for the
+local vector store backend (VECTOR_STORE_BACKEND=local), from the chunks
+that process_and_index_document stored in `chunks`. Vectors come from
+embed_texts, so chunks already in the embedding cache are not re-encoded.
+
+Usage:
+    python scripts/build_local_index.py                 # every company
+    python scripts/build_local_index.py --company acme  # one company
+"""
+
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add backend to path
+backend_root = Path(__file__).parent.parent
+sys.path.append(str(backend_root))
+
+from dotenv import load_dotenv
+load_dotenv(backend_root / ".env")
+
+from app.db.mongodb import db
+from app.services.embeddings import embed_texts
+from app.services.vector_store import get_vector_store
+
+
+def chunk_metadata(chunk: dict) -> dict:
+    """Same metadata process_and_index_document upserts alongside each vector."""
+    return {
+        "text": chunk["text"],
+        "source": chunk.get("source"),
+        "section": chunk.get("section"),
+        "doc_id": chunk.get("doc_id"),
+        "doc_type": chunk.get("doc_type"),
+        "company_id": chunk.get("company_id", ""),
+        "dimensions": chunk.get("dimensions", 384)
+    }
+
+
+async def build_local_index(company_id: str = None):
+    print("🔄 Building local vector indexes from chunks...")
+    print("="*60)
+
+    query = {"company_id": company_id.lower()} if company_id else {}
+    groups = await db.chunks.aggregate([
+        {"$match": query},
+        {"$group": {"_id": {"company_id": "$company_id", "dimensions": "$dimensions"}}}
+    ]).to_list(length=None)
+
+    for group in groups:
+        namespace = group["_id"].get("company_id") or ""
+        dimensions = group["_id"].get("dimensions") or 384
+
+        chunks = await db.chunks.find(
+            {"company_id": group["_id"].get("company_id"), "dimensions": group["_id"].get("dimensions")},
+            {"_id": 0, "chunk_id": 1, "text": 1, "source": 1, "section": 1,
+             "doc_id": 1, "doc_type": 1, "company_id": 1, "dimensions": 1}
+        ).to_list(length=None)
+        chunks = [c for c in chunks if c.get("chunk_id") and c.get("text")]
+
+        embeddings = await embed_texts([c["text"] for c in chunks], dimensions=dimensions)
+        vectors = [
+            (c["chunk_id"], embedding, chunk_metadata(c))
+            for c, embedding in zip(chunks, embeddings)
+        ]
+
+        store = get_vector_store(dimensions, backend="local")
+        count = await asyncio.to_thread(store.rebuild, vectors, namespace)
+        print(f"   ✓ '{namespace}' ({dimensions} dims): {count} vectors")
+
+    print("="*60)
+    print(f"✅ Built {len(groups)} namespace indexes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--company", help="Only rebuild this company's namespace")
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(build_local_index(args.company))
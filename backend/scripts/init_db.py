@@ -2,6 +2,7 @@ import sys
 import asyncio
 from pathlib import Path
 from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError, OperationFailure
 
 # Add backend root to path
 backend_root = Path(__file__).parent.parent
@@ -10,6 +11,7 @@ sys.path.append(str(backend_root))
 load_dotenv(backend_root / ".env")
 
 from app.db.mongodb import db
+from app.models.document import LIVE_STATUSES
 
 async def init_db():
     print("🛠️  INITIALIZING DATABASE SCHEMAS...")
@@ -26,6 +28,23 @@ async def init_db():
     # (No unique index needed on filename if we allow duplicates, but let's index doc_type)
     await db.documents.create_index("doc_type")
     await db.documents.create_index("status")
+    # Upload dedupe: one live document per company and file content. Concurrent
+    # uploads of the same bytes race past the lookup; this makes the second insert
+    # fail instead. Partial filters with $in need MongoDB 6.0+.
+    try:
+        await db.documents.drop_index("company_id_1_content_hash_1")  # Non-unique version
+    except OperationFailure:
+        pass
+    try:
+        await db.documents.create_index(
+            [("company_id", 1), ("content_hash", 1)],
+            name="company_content_hash_live",
+            unique=True,
+            partialFilterExpression={"content_hash": {"$type": "string"}, "status": {"$in": LIVE_STATUSES}}
+        )
+    except DuplicateKeyError:
+        print("   ❌ Several live documents share a file: delete the duplicates, then run init_db again")
+        raise
     print("   - Created indexes for 'documents'")
 
     # -------------------------------------------------
@@ -56,8 +75,13 @@ async def init_db():
     print("   - Created indexes for 'conversations'")
 
     # -------------------------------------------------
-    # 5. Internal Documents (Keyword Search)
+    # 5. Chunks (BM25 Keyword Search) & legacy Internal Documents
     # -------------------------------------------------
+    print("\n   [Chunks]")
+    # Per-tenant BM25 index builds and per-document deletes
+    await db.chunks.create_index([("company_id", 1), ("doc_id", 1)])
+    print("   - Created index on (company_id, doc_id) for 'chunks'")
+
     print("\n   [Internal Documents]")
     if "internal_documents" not in await db.list_collection_names():
         await db.create_collection("internal_documents")
@@ -69,7 +93,25 @@ async def init_db():
     print("   - Created TEXT index for 'internal_documents'")
     
     # -------------------------------------------------
-    # 6. Feedback / Negative Logs
+    # 6. Embedding Cache
+    # -------------------------------------------------
+    print("\n   [Embedding Cache]")
+    if "embedding_cache" not in await db.list_collection_names():
+        await db.create_collection("embedding_cache")
+        print("   - Created collection 'embedding_cache'")
+
+    # Bulk $in lookups hit this index; unique so concurrent misses don't duplicate.
+    # Existing deployments: run scripts/migrate_embedding_cache.py first, it
+    # removes the duplicate rows older versions wrote.
+    try:
+        await db.embedding_cache.create_index("cache_key", unique=True)
+    except DuplicateKeyError:
+        print("   ❌ Duplicate 'cache_key' entries found: run scripts/migrate_embedding_cache.py, then init_db again")
+        raise
+    print("   - Created unique index on 'cache_key' for 'embedding_cache'")
+
+    # -------------------------------------------------
+    # 7. Feedback / Negative Logs
     # -------------------------------------------------
     print("\n   [Feedback Logs]")
     if "negative_retrieval_logs" not in await db.list_collection_names():
@@ -0,0 +1,120 @@
+"""
+Migration Script: Compact the Embedding Cache
+
+Rewrites legacy `embedding_cache` entries (full chunk text + vector as a
+list of floats) into the compact format used by app.services.embeddings:
+binary float16/float32 vector, no duplicated text.
+
+Legacy writes had no dedupe, so concurrent misses stored the same
+`cache_key` several times. Those duplicates are removed first (one row per
+key is kept). Run this script BEFORE scripts/init_db.py on an existing
+deployment: init_db builds a unique index on `cache_key`, which fails while
+duplicates remain.
+
+Safe to run repeatedly; already-compact entries are skipped.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+backend_root = Path(__file__).parent.parent
+sys.path.append(str(backend_root))
+
+from dotenv import load_dotenv
+load_dotenv(backend_root / ".env")
+
+import numpy as np
+from pymongo import DeleteMany, UpdateOne
+
+from app.db.mongodb import db
+from app.services.embeddings import EMBED_CACHE_DTYPE, _encode_vector
+
+BATCH_SIZE = 1000
+
+
+async def dedupe_embedding_cache() -> int:
+    """Keep one row per cache_key (preferring an already-compact one); returns rows removed."""
+    pipeline = [
+        {"$group": {
+            "_id": "$cache_key",
+            "ids": {"$push": "$_id"},
+            "compact": {"$push": {"$cond": [{"$ifNull": ["$vector", False]}, "$_id", None]}},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+
+    ops = []
+    removed = 0
+    async for group in db.embedding_cache.aggregate(pipeline, allowDiskUse=True):
+        compact = [i for i in group["compact"] if i is not None]
+        keep = compact[0] if compact else group["ids"][0]
+        drop = [i for i in group["ids"] if i != keep]
+        ops.append(DeleteMany({"_id": {"$in": drop}}))
+        removed += len(drop)
+        if len(ops) >= BATCH_SIZE:
+            await db.embedding_cache.bulk_write(ops, ordered=False)
+            ops = []
+
+    if ops:
+        await db.embedding_cache.bulk_write(ops, ordered=False)
+    return removed
+
+
+async def migrate_embedding_cache():
+    """Convert list-of-float embeddings to compact binary vectors and drop stored text."""
+
+    print("🔄 Starting migration: Compacting embedding_cache...")
+    print("="*60)
+
+    stats_before = await db.command("collStats", "embedding_cache")
+    print(f"📊 Size before: {stats_before.get('size', 0) / 1024 / 1024:.2f} MB "
+          f"({stats_before.get('count', 0)} entries)")
+
+    removed = await dedupe_embedding_cache()
+    print(f"   ✓ {removed} duplicate entries removed")
+
+    cursor = db.embedding_cache.find(
+        {"embedding": {"$exists": True}},
+        {"_id": 1, "embedding": 1}
+    )
+
+    ops = []
+    migrated = 0
+    async for doc in cursor:
+        vec = np.asarray(doc["embedding"], dtype=np.float32)
+        ops.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {
+                "$set": {"vector": _encode_vector(vec), "dtype": EMBED_CACHE_DTYPE},
+                "$unset": {"embedding": "", "text": ""}
+            }
+        ))
+        if len(ops) >= BATCH_SIZE:
+            await db.embedding_cache.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            print(f"   ✓ {migrated} entries compacted")
+            ops = []
+
+    if ops:
+        await db.embedding_cache.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+
+    # Reclaim the freed space (not permitted on every deployment, e.g. shared Atlas tiers)
+    try:
+        await db.command("compact", "embedding_cache")
+    except Exception as e:
+        print(f"⚠️  compact skipped: {e}")
+
+    stats_after = await db.command("collStats", "embedding_cache")
+    print("="*60)
+    print(f"✅ Removed {removed} duplicates, compacted {migrated} entries")
+    print(f"📊 Size after: {stats_after.get('size', 0) / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(migrate_embedding_cache())